@@ -1,25 +1,212 @@
+import time
+
+# Stamped before the heavy imports so the cold-start report can account for them
+_IMPORT_STARTED = time.perf_counter()
+
 import discord
 from discord import AllowedMentions, app_commands
 from discord.ext import commands
 import json
+import logging
+import logging.handlers
+import queue
+import sys
 import shutil
 import re
 import os
+import signal
+import socket
 from dotenv import load_dotenv
 import threading
 import socketserver
 from http.server import BaseHTTPRequestHandler
-import time
+import atexit
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import hashlib
+import random
+import struct
+import bisect
+import codecs
+import datetime
+import functools
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import aiohttp
+from typing import Any, Awaitable, Callable
+
+
+# Extra attributes a record may carry (``extra={...}``) that end up as JSON fields
+LOG_RECORD_FIELDS = ("command", "guild", "user", "latency_ms", "outcome")
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line; Railway picks up ``level`` and ``message``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in LOG_RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SampledLogger(logging.Logger):
+    """Logger whose ``debug`` calls are sampled before a record is even built."""
+
+    debug_sample_rate = 1.0
+
+    def findCaller(self, stack_info=False, stacklevel=1):  # noqa: N802
+        # No formatter emits the caller's file or line; skip the stack walk per record
+        if stack_info:
+            return super().findCaller(stack_info, stacklevel + 1)
+        return "(unknown file)", 0, "(unknown function)", None
+
+    def debug(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.DEBUG) and (self.debug_sample_rate >= 1.0 or random.random() < self.debug_sample_rate):
+            self._log(logging.DEBUG, msg, args, **kwargs)
+
+
+class DebugSampler(logging.Filter):
+    """Lets through only ``rate`` of DEBUG records; higher levels always pass.
+
+    Covers third-party loggers (discord.py); our own ``SampledLogger`` drops
+    unsampled debug calls earlier.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self._rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or record.name.startswith("speedwagon"):
+            # Our own debug records were already sampled by SampledLogger
+            return True
+        return random.random() < self._rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread as-is and drops them when the queue is full.
+
+    The stock handler formats the message on the calling thread; here all
+    formatting happens on the listener, so logging from the event loop is a
+    ``put_nowait``.
+    """
+
+    dropped = 0
+
+    def __init__(self, log_queue: queue.SimpleQueue, limit: int = 10000):
+        super().__init__(log_queue)
+        self._limit = limit
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # SimpleQueue is unbounded but lock-free; cap it by hand so a stalled
+        # stdout can't grow memory without bound
+        if self.queue.qsize() >= self._limit:
+            type(self).dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+def _resolve_log_sample_rate(default: float = 1.0) -> float:
+    raw_rate = os.getenv("LOG_DEBUG_SAMPLE_RATE")
+    if not raw_rate:
+        return default
+    try:
+        return min(1.0, max(0.0, float(raw_rate)))
+    except ValueError:
+        return default
+
+
+def configure_logging() -> logging.handlers.QueueListener:
+    """Route every logger (discord.py's included) through a queue to a stdout writer thread.
+
+    ``LOG_LEVEL`` (default INFO), ``LOG_FORMAT`` (``json`` or ``text``) and
+    ``LOG_DEBUG_SAMPLE_RATE`` (0-1, default 1) tune the output.
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonLogFormatter())
+
+    # None of these record attributes are emitted; skip collecting them
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    sample_rate = _resolve_log_sample_rate()
+    SampledLogger.debug_sample_rate = sample_rate
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    level_name = os.getenv("LOG_LEVEL", "INFO").upper()
+    root.setLevel(logging.getLevelName(level_name) if isinstance(logging.getLevelName(level_name), int) else logging.INFO)
 
-# Load environment variables
-load_dotenv()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    # Drain whatever is still queued on shutdown
+    atexit.register(listener.stop)
+    return listener
+
+
+log_listener: logging.handlers.QueueListener | None = None
+logging.setLoggerClass(SampledLogger)
+log = logging.getLogger("speedwagon")
+logging.setLoggerClass(logging.Logger)
 
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+
+class InteractionRouter(app_commands.CommandTree):
+    """Command tree that owns interaction dispatch end to end.
+
+    discord.py already hands every interaction to the tree exactly once, so
+    the steps live here rather than in an ``on_interaction`` listener layered
+    on top: the barred-user filter (``interaction_check``) runs once, then the
+    built-in command lookup, and only a name the tree doesn't know falls back
+    to the custom-command table for customs not registered as slash commands.
+    """
+
+    async def _call(self, interaction: discord.Interaction) -> None:
+        try:
+            await super()._call(interaction)
+        except app_commands.CommandNotFound:
+            if not await self._answer_custom_command(interaction):
+                raise
+
+    @staticmethod
+    async def _answer_custom_command(interaction: discord.Interaction) -> bool:
+        if interaction.type is not discord.InteractionType.application_command:
+            return False
+        command_name = interaction.data.get('name') if interaction.data else None
+        response = custom_command_table.lookup(command_name) if command_name else None
+        if response is None:
+            return False
+        await interaction.response.send_message(response)
+        command_metrics.finish(interaction, "ok", command="custom")
+        return True
+
+
+bot = commands.Bot(command_prefix='!', intents=intents, tree_cls=InteractionRouter)
 
 # Data storage files (configurable directory for persistence)
 def resolve_data_dir() -> str:
@@ -36,19 +223,36 @@ def resolve_data_dir() -> str:
     # 3) Fallback to current directory
     return '.'
 
-DATA_DIR = resolve_data_dir()
-try:
-    os.makedirs(DATA_DIR, exist_ok=True)
-except Exception as _e:
-    print(f"⚠️ Could not ensure data directory {DATA_DIR}: {_e}")
-print(f"📦 Using data directory: {DATA_DIR}")
-
-COMMANDS_FILE = os.path.join(DATA_DIR, 'custom_commands.json')
-LINKS_FILE = os.path.join(DATA_DIR, 'payment_links.json')
-ENJOY_FILE = os.path.join(DATA_DIR, 'enjoy_messages.json')
-BARRED_USERS_FILE = os.path.join(DATA_DIR, 'barred_users.json')
-ACCOUNTS_FILE = os.path.join(DATA_DIR, 'accounts.json')
-WELCOME_FILE = os.path.join(DATA_DIR, 'welcome_messages.json')
+def shared_store_enabled() -> bool:
+    """SHARED_STORE=1: keep documents in speedwagon.db and elect one gateway leader among instances."""
+    return os.getenv('SHARED_STORE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def use_data_dir(data_dir: str) -> None:
+    """Point every persisted file at ``data_dir``; paths are unset until bootstrap calls this."""
+    global DATA_DIR, COMMANDS_FILE, LINKS_FILE, ENJOY_FILE, BARRED_USERS_FILE, ACCOUNTS_FILE
+    global WELCOME_FILE, DATABASE_FILE, COMMAND_SYNC_FILE, ROTATION_FILE, BUSINESS_STATUS_FILE
+    DATA_DIR = data_dir
+    COMMANDS_FILE = os.path.join(DATA_DIR, 'custom_commands.json')
+    LINKS_FILE = os.path.join(DATA_DIR, 'payment_links.json')
+    ENJOY_FILE = os.path.join(DATA_DIR, 'enjoy_messages.json')
+    BARRED_USERS_FILE = os.path.join(DATA_DIR, 'barred_users.json')
+    ACCOUNTS_FILE = os.path.join(DATA_DIR, 'accounts.json')
+    WELCOME_FILE = os.path.join(DATA_DIR, 'welcome_messages.json')
+    DATABASE_FILE = os.path.join(DATA_DIR, 'speedwagon.db')
+    COMMAND_SYNC_FILE = os.path.join(DATA_DIR, 'command_sync.json')
+    ROTATION_FILE = os.path.join(DATA_DIR, 'rotation_state.bin')
+    BUSINESS_STATUS_FILE = os.path.join(DATA_DIR, 'business_status.json')
+
+
+def prepare_data_dir() -> None:
+    use_data_dir(resolve_data_dir())
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+    except Exception as exc:
+        log.warning(f"⚠️ Could not ensure data directory {DATA_DIR}: {exc}")
+    log.info(f"📦 Using data directory: {DATA_DIR}")
+
 DEFAULT_BARRED_USERS: tuple[str, ...] = (
     "1405894979095892108",
 )
@@ -170,17 +374,192 @@ def migrate_legacy_file(legacy_path: str, new_path: str) -> None:
     try:
         if os.path.exists(legacy_path) and not os.path.exists(new_path):
             shutil.copy2(legacy_path, new_path)
-            print(f"✅ Migrated {legacy_path} -> {new_path}")
+            log.info(f"✅ Migrated {legacy_path} -> {new_path}")
     except Exception as e:
-        print(f"⚠️ Migration failed for {legacy_path}: {e}")
+        log.warning(f"⚠️ Migration failed for {legacy_path}: {e}")
+
+# Latency buckets (seconds) shared by every histogram
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MetricLabels = tuple[tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: MetricLabels, extra: tuple[str, str] | None = None) -> str:
+    if extra is not None:
+        labels = labels + (extra,)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Counters, histograms and scrape-time gauges in the Prometheus text format.
+
+    Recording is a dict update under one uncontended lock, cheap enough to
+    leave on for every command and storage write. Gauges are callbacks run
+    only when ``/metrics`` is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._counters: dict[str, dict[MetricLabels, float]] = {}
+        self._histograms: dict[str, dict[MetricLabels, _Histogram]] = {}
+        self._gauges: dict[str, Callable[[], Any]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("counter", help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("histogram", help_text)
+        self._histograms.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], Any]) -> None:
+        """``callback`` returns a number or an iterable of ``(labels, value)`` pairs."""
+        self._meta[name] = ("gauge", help_text)
+        self._gauges[name] = callback
+
+    def inc(self, name: str, labels: MetricLabels = (), value: float = 1.0) -> None:
+        series = self._counters[name]
+        with self._lock:
+            series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: MetricLabels = ()) -> None:
+        series = self._histograms[name]
+        index = bisect.bisect_left(METRIC_BUCKETS, value)
+        with self._lock:
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = _Histogram()
+            histogram.counts[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {labels: (list(h.counts), h.sum, h.count) for labels, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+        for name, (kind, help_text) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for labels, value in counters[name].items():
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            elif kind == "histogram":
+                for labels, (counts, total, count) in histograms[name].items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(METRIC_BUCKETS, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+            else:
+                try:
+                    value = self._gauges[name]()
+                except Exception as exc:
+                    lines.append(f"# {name} unavailable: {exc}")
+                    continue
+                if value is None:
+                    continue
+                if isinstance(value, (int, float)):
+                    lines.append(f"{name} {value:g}")
+                else:
+                    for labels, sample in value:
+                        lines.append(f"{name}{_format_labels(labels)} {sample:g}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+metrics.counter("speedwagon_command_invocations_total", "Slash command invocations by outcome.")
+metrics.histogram("speedwagon_command_duration_seconds", "Slash command handling time.")
+metrics.counter("speedwagon_command_deferrals_total", "Slash commands deferred to stay within the response budget.")
+metrics.histogram("speedwagon_storage_io_seconds", "JSON document disk reads and writes.")
+metrics.counter("speedwagon_storage_mutations_total", "In-memory document mutations (put or journaled op).")
+metrics.histogram("speedwagon_account_queue_seconds", "SQLite account queue operations.")
+metrics.histogram("speedwagon_event_loop_lag_seconds", "Event loop scheduling delay samples.")
+metrics.gauge("speedwagon_log_records_dropped", "Log records dropped because the log queue was full.", lambda: _NonBlockingQueueHandler.dropped)
+
+
+class RuntimeHealth:
+    """Liveness/readiness computed from flags other components keep current.
+
+    The event loop stamps ``beat()`` periodically, gateway events flip
+    ``gateway_connected`` and readiness checks only read cached attributes,
+    so a probe never waits on a lock, the loop or the disk.
+    """
+
+    def __init__(self, heartbeat_timeout: float = 15.0, startup_grace: float = 120.0):
+        self._heartbeat_timeout = heartbeat_timeout
+        self._startup_grace = startup_grace
+        self._started = time.monotonic()
+        self.last_heartbeat: float | None = None
+        self.gateway_connected = False
+        self._checks: list[tuple[str, Callable[[], str | None]]] = []
+
+    def beat(self) -> None:
+        self.last_heartbeat = time.monotonic()
+
+    def add_readiness_check(self, name: str, check: Callable[[], str | None]) -> None:
+        """``check`` returns None when healthy, otherwise a short reason."""
+        self._checks.append((name, check))
+
+    def _heartbeat_problem(self) -> str | None:
+        now = time.monotonic()
+        if self.last_heartbeat is None:
+            if now - self._started > self._startup_grace:
+                return f"no event loop heartbeat {now - self._started:.0f}s after start"
+            return None
+        age = now - self.last_heartbeat
+        if age > self._heartbeat_timeout:
+            return f"event loop heartbeat is {age:.1f}s old"
+        return None
+
+    def liveness(self) -> list[str]:
+        problem = self._heartbeat_problem()
+        return [problem] if problem else []
+
+    def readiness(self) -> list[str]:
+        problems = self.liveness()
+        if self.last_heartbeat is None:
+            problems.append("event loop not started")
+        if not self.gateway_connected:
+            problems.append("gateway disconnected")
+        for name, check in self._checks:
+            try:
+                problem = check()
+            except Exception as exc:
+                problem = f"check failed: {exc}"
+            if problem:
+                problems.append(f"{name}: {problem}")
+        return problems
+
+
+runtime_health = RuntimeHealth()
 
-migrate_legacy_file('custom_commands.json', COMMANDS_FILE)
-migrate_legacy_file('payment_links.json', LINKS_FILE)
-migrate_legacy_file('enjoy_messages.json', ENJOY_FILE)
 
 # Simple HTTP health server used by deployment platforms
 class _HealthCheckHandler(BaseHTTPRequestHandler):
-    """Simple handler that always returns HTTP 200 with a plain text body."""
+    """Serves ``/livez``, ``/readyz`` and ``/metrics``; every other path returns a static "OK"."""
 
     # Disable default logging to stderr to avoid noisy output on health probes
     def log_message(self, format, *args):
@@ -196,11 +575,42 @@ class _HealthCheckHandler(BaseHTTPRequestHandler):
         if self.command != "HEAD":
             self.wfile.write(body)
 
+    def _write_metrics(self):
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _write_probe(self, problems: list[str]):
+        body = ("ok" if not problems else "\n".join(problems)).encode("utf-8")
+        self.send_response(200 if not problems else 503)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _route(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._write_metrics()
+        elif path == "/livez":
+            self._write_probe(runtime_health.liveness())
+        elif path == "/readyz":
+            self._write_probe(runtime_health.readiness())
+        else:
+            # /health and anything else: the process is up
+            self._write_ok()
+
     def do_GET(self):  # noqa: N802 (discord bot project - keep discord naming conventions)
-        self._write_ok()
+        self._route()
 
     def do_HEAD(self):  # noqa: N802
-        self._write_ok()
+        self._route()
 
 
 class _ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
@@ -221,7 +631,7 @@ def _resolve_port(default: int = 8080) -> int:
             raise ValueError("Port must be positive")
         return value
     except (TypeError, ValueError) as exc:
-        print(f"⚠️ Invalid PORT value '{raw_port}': {exc}. Falling back to {default}.")
+        log.warning(f"⚠️ Invalid PORT value '{raw_port}': {exc}. Falling back to {default}.")
         return default
 
 
@@ -231,36 +641,625 @@ def start_health_server():
     try:
         port = _resolve_port()
         if _health_server is not None:
-            print("ℹ️ Health server already running; reusing existing instance")
+            log.info("ℹ️ Health server already running; reusing existing instance")
             return True
 
-        print(f"Starting health server on port {port}")
+        log.info(f"Starting health server on port {port}")
         server = _ThreadedTCPServer(('0.0.0.0', port), _HealthCheckHandler)
         thread = threading.Thread(target=server.serve_forever, daemon=True)
         thread.start()
         _health_server = server
-        print(f"✅ Health server listening on port {port}")
+        log.info(f"✅ Health server listening on port {port}")
         return True
     except OSError as exc:
-        print(f"❌ Failed to bind health server on port {port}: {exc}")
+        log.error(f"❌ Failed to bind health server on port {port}: {exc}")
         return False
     except Exception as exc:  # Fallback for unexpected issues
-        print(f"❌ Failed to start health server: {exc}")
+        log.error(f"❌ Failed to start health server: {exc}")
         return False
 
+class _Document:
+    """Bookkeeping for a single JSON document managed by :class:`DocumentStore`."""
+
+    __slots__ = (
+        "name", "path", "journal_path", "default", "normalize", "data", "loaded",
+        "signature", "listeners", "dirty", "pending_ops", "journal_base", "journal_length", "row_version",
+    )
+
+    def __init__(self, name: str, path: str, default: Callable[[], Any], normalize: Callable[[Any], tuple[Any, bool]] | None):
+        self.name = name
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.default = default
+        self.normalize = normalize
+        self.data: Any = None
+        self.loaded = False
+        self.signature: tuple[int, int] | None = None
+        self.listeners: list[Callable[[Any], None]] = []
+        # A full snapshot is owed to disk
+        self.dirty = False
+        # Serialized mutations applied in memory but not yet appended to the journal
+        self.pending_ops: list[str] = []
+        # Content hash of the snapshot the on-disk journal applies to
+        self.journal_base: str | None = None
+        self.journal_length = 0
+        # Version of the shared-database row last read or written (shared mode only)
+        self.row_version = 0
+
+
+def _apply_document_op(data: dict, op: dict) -> None:
+    """Apply one journaled mutation to a document in place."""
+    kind = op["op"]
+    key = op["key"]
+    if kind == "set":
+        data[key] = op["value"]
+    elif kind == "delete":
+        data.pop(key, None)
+    else:
+        raise ValueError(f"Unknown journal op: {kind}")
+
+
+def _content_hash(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _fsync_directory(path: str) -> None:
+    # Make the rename itself durable; not supported on every platform
+    try:
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path: str, raw: bytes) -> None:
+    """Write ``raw`` to ``path`` via a fsynced temp file and an atomic rename."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+
+class SharedDocumentDatabase:
+    """The ``documents`` table of a WAL-mode SQLite database shared by every instance.
+
+    Each row holds one document's JSON and a version bumped on every write.
+    A full save replaces the row (last writer wins); journaled ops are replayed
+    onto the stored body inside the write transaction, so small edits made by
+    different instances all land. ``PRAGMA data_version`` only moves when
+    another connection commits, so polling for outside changes costs one
+    pragma while nobody else is writing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data_version: int | None = None
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "name TEXT PRIMARY KEY, body TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def read(self, name: str) -> tuple[str, int] | None:
+        with self._lock:
+            return self._conn.execute("SELECT body, version FROM documents WHERE name = ?", (name,)).fetchone()
+
+    def seed(self, name: str, payload: str) -> tuple[str, int]:
+        """Create the row unless another instance got there first; returns the stored ``(body, version)``."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO documents (name, body, version, updated_at) VALUES (?, ?, 1, ?)",
+                (name, payload, time.time()),
+            )
+            return self._conn.execute("SELECT body, version FROM documents WHERE name = ?", (name,)).fetchone()
+
+    def write(
+        self, name: str, payload: str | None, ops: list[str], default: Callable[[], Any]
+    ) -> tuple[int, int, Any]:
+        """Store ``payload``, or replay ``ops`` onto the stored body when it is None.
+
+        Returns ``(version, previous_version, merged)`` where ``merged`` is the
+        document the ops produced (None for a full save).
+        """
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT body, version FROM documents WHERE name = ?", (name,)).fetchone()
+                previous = row[1] if row else 0
+                merged = None
+                if payload is None:
+                    merged = json.loads(row[0]) if row else default()
+                    for line in ops:
+                        _apply_document_op(merged, json.loads(line))
+                    payload = json.dumps(merged)
+                conn.execute(
+                    "INSERT INTO documents (name, body, version, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET body = excluded.body, version = excluded.version, "
+                    "updated_at = excluded.updated_at",
+                    (name, payload, previous + 1, time.time()),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return previous + 1, previous, merged
+
+    def changed_versions(self) -> dict[str, int] | None:
+        """Every row's version, or None if no other connection has committed since the last call."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return None
+            self._data_version = data_version
+            return dict(self._conn.execute("SELECT name, version FROM documents"))
+
+
+class DocumentStore:
+    """Write-behind, in-memory cache for the bot's JSON documents.
+
+    Saves are written as atomic snapshots by a background thread; small edits
+    are appended to a ``<file>.journal`` keyed to the snapshot's hash and
+    replayed on load.
+    """
+
+    def __init__(self, flush_delay: float = 0.25, poll_interval: float = 2.0, compact_after: int = 500):
+        self._documents: dict[str, _Document] = {}
+        self._dirty_names: set[str] = set()
+        self._inflight: set[str] = set()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_delay = flush_delay
+        self._poll_interval = poll_interval
+        self._compact_after = compact_after
+        self._writer: threading.Thread | None = None
+        self._flush_hooks: list[Callable[[], None]] = []
+        self._database: SharedDocumentDatabase | None = None
+        # Health flags written by the writer thread, read lock-free by probes
+        self.last_write_error: str | None = None
+        self.last_writer_tick: float | None = None
+        self.data_dir_writable = True
+
+    def register(
+        self,
+        name: str,
+        path: str,
+        default: Callable[[], Any],
+        normalize: Callable[[Any], tuple[Any, bool]] | None = None,
+    ) -> None:
+        """Declare a document. ``normalize`` returns ``(data, needs_save)`` for data read from disk."""
+        self._documents[name] = _Document(name, path, default, normalize)
+
+    def use_database(self, database: SharedDocumentDatabase) -> None:
+        """Keep documents in a shared database; JSON files are only read to seed missing rows."""
+        self._database = database
+
+    @staticmethod
+    def _stat(path: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _read_journal(doc: _Document, base: str) -> tuple[list[dict], bool] | None:
+        """Return ``(ops, intact)`` journaled against snapshot ``base``, or None if the journal doesn't apply."""
+        try:
+            with open(doc.journal_path, 'rb') as f:
+                lines = f.read().split(b'\n')
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if not isinstance(header, dict) or header.get("base") != base:
+            return None
+        ops: list[dict] = []
+        for line in lines[1:]:
+            if not line.strip():
+                continue
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                # A torn final append from a crash; everything before it is intact
+                return ops, False
+        return ops, True
+
+    def _read(self, doc: _Document) -> tuple[Any, bool]:
+        started = time.perf_counter()
+        try:
+            return self._read_document(doc)
+        finally:
+            metrics.observe("speedwagon_storage_io_seconds", time.perf_counter() - started, (("document", doc.name), ("op", "read")))
+
+    def _read_document(self, doc: _Document) -> tuple[Any, bool]:
+        if self._database is None:
+            return self._read_file(doc)
+        row = self._database.read(doc.name)
+        if row is None:
+            # First start on the shared database: seed the row from the JSON file, if any.
+            # Instances starting together race here; whichever row landed first wins
+            data, _ = self._read_file(doc)
+            row = self._database.seed(doc.name, json.dumps(data))
+        body, doc.row_version = row
+        data = json.loads(body)
+        needs_save = False
+        if doc.normalize is not None:
+            data, needs_save = doc.normalize(data)
+        return data, needs_save
+
+    def _read_file(self, doc: _Document) -> tuple[Any, bool]:
+        try:
+            with open(doc.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            doc.journal_base = None
+            return doc.default(), True
+        data = json.loads(raw)
+        base = _content_hash(raw)
+        journal = self._read_journal(doc, base)
+        intact = False
+        if journal is not None:
+            ops, intact = journal
+            for op in ops:
+                _apply_document_op(data, op)
+            if ops:
+                log.info(f"♻️ Replayed {len(ops)} journaled change(s) onto {doc.path}")
+        if intact:
+            doc.journal_base = base
+            doc.journal_length = len(ops)
+        else:
+            # No journal for this snapshot yet, or one with a torn tail that new
+            # appends would be glued onto; rewriting the snapshot starts a fresh one
+            doc.journal_base = None
+            doc.journal_length = 0
+        needs_save = not intact
+        if doc.normalize is not None:
+            data, healed = doc.normalize(data)
+            needs_save = needs_save or healed
+        return data, needs_save
+
+    def _load(self, doc: _Document) -> None:
+        try:
+            data, needs_save = self._read(doc)
+        except ValueError as exc:
+            log.warning(f"⚠️ Could not parse {doc.path}: {exc}. Using defaults in memory.")
+            data, needs_save = doc.default(), False
+            if self._database is None:
+                # The first write would replace the damaged file with the defaults;
+                # set it aside so it can be recovered by hand
+                self._quarantine(doc)
+                needs_save = True
+        doc.data = data
+        doc.loaded = True
+        doc.signature = self._stat(doc.path)
+        if needs_save:
+            self.put(doc.name, data)
+
+    @staticmethod
+    def _quarantine(doc: _Document) -> None:
+        suffix = f".corrupt-{int(time.time())}"
+        for path in (doc.path, doc.journal_path):
+            if not os.path.exists(path):
+                continue
+            try:
+                os.replace(path, path + suffix)
+            except OSError as exc:
+                # Renaming within the directory failed, so the snapshot write will fail too
+                log.error(f"❌ Could not move {path} aside: {exc}")
+                continue
+            log.warning(f"⚠️ Moved damaged {path} to {path + suffix}")
+        doc.journal_base = None
+        doc.journal_length = 0
+
+    def get(self, name: str) -> Any:
+        """Return the cached document, loading it from disk on first use."""
+        doc = self._documents[name]
+        if not doc.loaded:
+            with self._lock:
+                if not doc.loaded:
+                    self._load(doc)
+        return doc.data
+
+    def peek(self, name: str) -> Any:
+        """Read a document from disk (replaying its journal) without caching it or scheduling writes."""
+        doc = self._documents[name]
+        data, _ = self._read(doc)
+        return data
+
+    def _mark_dirty(self, doc: _Document) -> None:
+        with self._lock:
+            doc.dirty = True
+            self._dirty_names.add(doc.name)
+        self._wakeup.set()
+
+    def put(self, name: str, data: Any) -> None:
+        """Replace the cached document and schedule a full snapshot write."""
+        doc = self._documents[name]
+        with self._lock:
+            doc.data = data
+            doc.loaded = True
+            self._mark_dirty(doc)
+        metrics.inc("speedwagon_storage_mutations_total", (("document", name), ("op", "put")))
+        self._notify(doc)
+
+    def apply(self, name: str, op: dict) -> None:
+        """Apply a ``set`` or ``delete`` of one key in memory and journal it instead of rewriting the document."""
+        doc = self._documents[name]
+        data = self.get(name)
+        line = json.dumps(op)
+        with self._lock:
+            _apply_document_op(data, op)
+            if not doc.dirty:
+                doc.pending_ops.append(line)
+                self._dirty_names.add(name)
+        self._wakeup.set()
+        metrics.inc("speedwagon_storage_mutations_total", (("document", name), ("op", op["op"])))
+        self._notify(doc)
+
+    def subscribe(self, name: str, listener: Callable[[Any], None]) -> None:
+        """Call ``listener(data)`` now and whenever the document changes."""
+        self._documents[name].listeners.append(listener)
+        listener(self.get(name))
+
+    def _notify(self, doc: _Document) -> None:
+        for listener in doc.listeners:
+            try:
+                listener(doc.data)
+            except Exception as exc:
+                log.warning(f"⚠️ Storage listener for {doc.name} failed: {exc}")
+
+    def preload(self) -> None:
+        """Load every registered document, creating missing files with their defaults."""
+        for name in self._documents:
+            self.get(name)
+
+    def _write_snapshot(self, doc: _Document, payload: str) -> None:
+        started = time.perf_counter()
+        raw = json.dumps(json.loads(payload), indent=2).encode('utf-8')
+        base = _content_hash(raw)
+        if base == doc.journal_base:
+            # Same bytes as the snapshot the current journal extends; nudge the hash
+            # so a crash before the journal reset can't replay old ops onto it
+            raw += b'\n'
+            base = _content_hash(raw)
+        _atomic_write(doc.path, raw)
+        _atomic_write(doc.journal_path, json.dumps({"base": base}).encode('utf-8') + b'\n')
+        doc.journal_base = base
+        doc.journal_length = 0
+        metrics.observe("speedwagon_storage_io_seconds", time.perf_counter() - started, (("document", doc.name), ("op", "snapshot")))
+
+    @staticmethod
+    def _append_journal(doc: _Document, lines: list[str]) -> None:
+        started = time.perf_counter()
+        with open(doc.journal_path, 'ab') as f:
+            f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        doc.journal_length += len(lines)
+        metrics.observe("speedwagon_storage_io_seconds", time.perf_counter() - started, (("document", doc.name), ("op", "journal")))
+
+    def _write_row(self, doc: _Document, payload: str | None, ops: list[str]) -> None:
+        started = time.perf_counter()
+        version, previous, merged = self._database.write(doc.name, payload, ops, doc.default)
+        metrics.observe("speedwagon_storage_io_seconds", time.perf_counter() - started, (("document", doc.name), ("op", "row")))
+        # Another instance wrote in between: our ops were replayed on top of its
+        # version, so the merged result is the document now
+        adopt = merged is not None and previous != doc.row_version
+        with self._lock:
+            doc.row_version = version
+            if adopt and doc.name not in self._dirty_names:
+                doc.data = merged
+            else:
+                adopt = False
+        if adopt:
+            log.info(f"🔄 Merged {doc.name} with changes from another instance")
+            self._notify(doc)
+
+    def flush(self) -> None:
+        """Write every pending snapshot and journal entry to disk now (blocking)."""
+        with self._write_lock:
+            with self._lock:
+                names, self._dirty_names = self._dirty_names, set()
+                work: list[tuple[_Document, str | None, list[str]]] = []
+                for name in names:
+                    doc = self._documents[name]
+                    needs_snapshot = self._database is None and (
+                        doc.journal_base is None or doc.journal_length >= self._compact_after
+                    )
+                    if doc.dirty or needs_snapshot:
+                        # The snapshot supersedes any ops still waiting for the journal
+                        work.append((doc, json.dumps(doc.data), []))
+                        doc.dirty = False
+                    else:
+                        work.append((doc, None, doc.pending_ops))
+                    doc.pending_ops = []
+                self._inflight.update(names)
+            for doc, payload, ops in work:
+                try:
+                    if self._database is not None:
+                        if payload is not None or ops:
+                            self._write_row(doc, payload, ops)
+                    elif payload is not None:
+                        self._write_snapshot(doc, payload)
+                        doc.signature = self._stat(doc.path)
+                    elif ops:
+                        self._append_journal(doc, ops)
+                    self.last_write_error = None
+                except (OSError, sqlite3.Error) as exc:
+                    log.warning(f"⚠️ Failed to write {doc.path}: {exc}")
+                    self.last_write_error = f"{os.path.basename(doc.path)}: {getattr(exc, 'strerror', None) or exc}"
+                    self._mark_dirty(doc)
+                finally:
+                    with self._lock:
+                        self._inflight.discard(doc.name)
+        self._run_flush_hooks()
+
+    def add_flush_hook(self, hook: Callable[[], None]) -> None:
+        """Run ``hook`` on the writer thread after every flush and poll tick."""
+        self._flush_hooks.append(hook)
+
+    def _run_flush_hooks(self) -> None:
+        for hook in self._flush_hooks:
+            try:
+                hook()
+            except Exception as exc:
+                log.warning(f"⚠️ Storage flush hook failed: {exc}")
+
+    def _poll_external_changes(self) -> None:
+        versions = None
+        if self._database is not None:
+            versions = self._database.changed_versions()
+            if versions is None:
+                return
+        for doc in list(self._documents.values()):
+            if not doc.loaded:
+                continue
+            with self._lock:
+                if doc.name in self._dirty_names or doc.name in self._inflight:
+                    continue
+            signature = None
+            if versions is not None:
+                if versions.get(doc.name, doc.row_version) == doc.row_version:
+                    continue
+            else:
+                signature = self._stat(doc.path)
+                if signature is None or signature == doc.signature:
+                    continue
+            try:
+                data, needs_save = self._read(doc)
+            except (OSError, ValueError, sqlite3.Error) as exc:
+                log.warning(f"⚠️ Ignoring unreadable change to {doc.path}: {exc}")
+                doc.signature = signature
+                continue
+            with self._lock:
+                if doc.name in self._dirty_names or doc.name in self._inflight:
+                    # Edited here meanwhile; the next write merges the two
+                    continue
+                doc.data = data
+                doc.signature = signature
+            log.info(f"🔄 Reloaded {doc.name if versions is not None else doc.path} after an external change")
+            if needs_save:
+                self.put(doc.name, data)
+            else:
+                self._notify(doc)
+
+    def refresh(self) -> None:
+        """Pick up outside changes now instead of at the next poll tick (blocking)."""
+        self._poll_external_changes()
+
+    def _run(self) -> None:
+        last_poll = time.monotonic()
+        while True:
+            self.last_writer_tick = time.monotonic()
+            self._wakeup.wait(timeout=self._poll_interval)
+            if self._wakeup.is_set() or self._dirty_names:
+                # Give a burst of saves a moment to land so they share one write
+                time.sleep(self._flush_delay)
+                self._wakeup.clear()
+                self.flush()
+            now = time.monotonic()
+            if now - last_poll >= self._poll_interval:
+                last_poll = now
+                try:
+                    self._poll_external_changes()
+                except Exception as exc:
+                    log.warning(f"⚠️ Storage watcher error: {exc}")
+                self._run_flush_hooks()
+                self.data_dir_writable = all(
+                    os.access(directory, os.W_OK)
+                    for directory in {os.path.dirname(doc.path) or '.' for doc in self._documents.values()}
+                )
+
+    def health_problem(self) -> str | None:
+        """Why storage can't be trusted right now, from cached flags only (no I/O)."""
+        if self._writer is None or not self._writer.is_alive():
+            return "writer thread not running"
+        if not self.data_dir_writable:
+            return "data directory is not writable"
+        if self.last_write_error:
+            return f"last write failed ({self.last_write_error})"
+        tick = self.last_writer_tick
+        if tick is not None and time.monotonic() - tick > max(30.0, self._poll_interval * 10):
+            return f"writer thread stalled for {time.monotonic() - tick:.0f}s"
+        return None
+
+    def start(self) -> None:
+        """Start the background writer/watcher thread (idempotent)."""
+        if self._writer is not None:
+            return
+        self._writer = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+
+storage = DocumentStore()
+
+
 # Load custom commands
 def load_custom_commands():
-    try:
-        with open(COMMANDS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    return storage.get("custom_commands")
+
+
+class CustomCommandTable:
+    """Name -> response dispatch table for custom commands.
+
+    The table is rebuilt off the hot path whenever the custom_commands
+    document changes and swapped in with a single assignment, so dispatch is
+    one dict probe. Names that belong to built-in slash commands are never
+    placed in the table, which makes every built-in a guaranteed miss that
+    falls straight through to the command tree.
+    """
+
+    def __init__(self, store: DocumentStore, name: str = "custom_commands"):
+        self._store = store
+        self._name = name
+        self._builtin_names: frozenset[str] = frozenset()
+        self._table: dict[str, str] = {}
+        self._listeners: list[Callable[[frozenset[str]], None]] = []
+        store.subscribe(name, self._rebuild)
+
+    def _rebuild(self, data: dict) -> None:
+        builtin_names = self._builtin_names
+        self._table = {name: response for name, response in data.items() if name not in builtin_names}
+        names = self.names()
+        for listener in self._listeners:
+            listener(names)
 
+    def add_listener(self, listener: Callable[[frozenset[str]], None]) -> None:
+        """Call ``listener(names)`` whenever the set of custom commands may have changed."""
+        self._listeners.append(listener)
 
-def ensure_accounts_store() -> None:
-    """Create an empty accounts database if it does not already exist."""
-    if not os.path.exists(ACCOUNTS_FILE):
-        save_accounts({})
+    def names(self) -> frozenset[str]:
+        return frozenset(self._table)
+
+    def set_builtin_names(self, names: set[str] | frozenset[str]) -> None:
+        """Record the built-in command names so custom entries can't shadow them."""
+        self._builtin_names = frozenset(names)
+        self._rebuild(self._store.get(self._name))
+
+    def is_builtin(self, name: str) -> bool:
+        return name in self._builtin_names
+
+    def lookup(self, name: str) -> str | None:
+        return self._table.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._table
 
 
 def normalize_account_line(account_line: str) -> str:
@@ -271,65 +1270,463 @@ def normalize_account_line(account_line: str) -> str:
     return clean_line
 
 
-def load_accounts() -> dict[str, list[str]]:
-    """Load the stored accounts grouped by category name."""
-    ensure_accounts_store()
-    with open(ACCOUNTS_FILE, 'r') as f:
-        data = json.load(f)
-        # Ensure the structure is always mapping -> list[str]
-        if not isinstance(data, dict):
-            return {}
-        normalized: dict[str, list[str]] = {}
-        for key, value in data.items():
-            if isinstance(value, list):
-                normalized[key] = [normalize_account_line(str(entry)) for entry in value]
-        return normalized
+def _normalize_accounts_document(data: Any) -> tuple[dict[str, list[str]], bool]:
+    # Ensure the structure is always mapping -> list[str]
+    if not isinstance(data, dict):
+        return {}, False
+    normalized: dict[str, list[str]] = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            normalized[key] = [normalize_account_line(str(entry)) for entry in value]
+    return normalized, False
+
+
+def load_legacy_accounts() -> dict[str, list[str]]:
+    """Read accounts.json (replaying its journal) without adopting it into the live store."""
+    legacy = DocumentStore()
+    legacy.register("accounts", ACCOUNTS_FILE, dict, _normalize_accounts_document)
+    return legacy.peek("accounts")
+
+
+def account_digest(line: str) -> bytes:
+    """Compact fingerprint of a normalized account line for the ingest index."""
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
+
+
+class AccountLease:
+    """An account reserved by ``AccountQueueStore.reserve`` and not yet settled."""
+
+    __slots__ = ("id", "account_id", "category", "line", "remaining")
+
+    def __init__(self, lease_id: int, account_id: int, category: str, line: str, remaining: int):
+        self.id = lease_id
+        self.account_id = account_id
+        self.category = category
+        self.line = line
+        self.remaining = remaining
+
+
+class AccountQueueStore:
+    """FIFO account queues, one per category, kept in SQLite and run on a single writer thread.
+
+    Pulls are leases: ``reserve`` takes the head row, ``confirm`` settles it
+    and ``release`` or the reaper puts it back at the head of its queue.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0):
+        self._path = path
+        self._lease_seconds = lease_seconds
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="account-queue")
+        self._counts: dict[str, int] = {}
+        self._leased = 0
+        # Leases dropped by /clearaccount while their pull was still in flight
+        self._cleared: set[int] = set()
+        self._reaper: asyncio.Task | None = None
+
+    def _connect(self) -> None:
+        conn = sqlite3.connect(self._path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS account_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                line TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS account_queue_head ON account_queue (category, id);
+            CREATE TABLE IF NOT EXISTS account_counts (
+                category TEXT PRIMARY KEY,
+                remaining INTEGER NOT NULL
+            );
+            -- Digest of every line ever ingested; kept after pulls so re-imports are rejected
+            CREATE TABLE IF NOT EXISTS account_index (
+                category TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                PRIMARY KEY (category, digest)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS account_leases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL UNIQUE,
+                category TEXT NOT NULL,
+                line TEXT NOT NULL,
+                holder INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS account_leases_expiry ON account_leases (expires_at);
+            """
+        )
+        self._conn = conn
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._backfill_index()
+        self._refresh()
+
+    def _refresh(self) -> None:
+        self._counts = dict(self._conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+        self._leased = self._conn.execute("SELECT COUNT(*) FROM account_leases").fetchone()[0]
+
+    def _backfill_index(self) -> None:
+        # Queues created before the ingest index existed: seed it from what is still queued
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO account_index (category, digest) VALUES (?, ?)",
+                ((category, account_digest(line)) for category, line in conn.execute("SELECT category, line FROM account_queue").fetchall()),
+            )
+            conn.execute("DROP INDEX IF EXISTS account_queue_line")
+            conn.execute("PRAGMA user_version = 1")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _import_legacy(self) -> None:
+        if not os.path.exists(ACCOUNTS_FILE):
+            return
+        legacy = load_legacy_accounts()
+        imported = 0
+        for category, lines in legacy.items():
+            imported += self._push(category, lines)
+        for suffix in ('', '.journal'):
+            if os.path.exists(ACCOUNTS_FILE + suffix):
+                os.replace(ACCOUNTS_FILE + suffix, ACCOUNTS_FILE + suffix + '.migrated')
+        log.info(f"✅ Imported {imported} account(s) from {ACCOUNTS_FILE} into {self._path}")
+
+    def _open(self) -> None:
+        if self._conn is None:
+            self._connect()
+            self._import_legacy()
+            # Leases left behind by a previous run come back once they expire
+            self._reap(time.time())
+
+    def open(self) -> None:
+        """Open the database (creating it if needed) and import a legacy accounts.json once."""
+        self._executor.submit(self._open).result()
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, func, *args)
+
+    @staticmethod
+    def _timed(func: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            metrics.observe("speedwagon_account_queue_seconds", time.perf_counter() - started, (("op", func.__name__.lstrip("_")),))
+
+    def _set_count(self, category: str, remaining: int) -> None:
+        if remaining > 0:
+            self._conn.execute(
+                "INSERT INTO account_counts (category, remaining) VALUES (?, ?) "
+                "ON CONFLICT(category) DO UPDATE SET remaining = excluded.remaining",
+                (category, remaining),
+            )
+            self._counts[category] = remaining
+        else:
+            self._conn.execute("DELETE FROM account_counts WHERE category = ?", (category,))
+            self._counts.pop(category, None)
+
+    def _push(self, category: str, lines: list[str]) -> int:
+        conn = self._conn
+        # First occurrence wins within the batch
+        batch: dict[bytes, str] = {}
+        for line in lines:
+            batch.setdefault(account_digest(line), line)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # The index remembers every line ever ingested, including ones already pulled
+            digests = list(batch)
+            seen: set[bytes] = set()
+            for start in range(0, len(digests), 500):
+                part = digests[start:start + 500]
+                seen.update(
+                    row[0] for row in conn.execute(
+                        f"SELECT digest FROM account_index WHERE category = ? AND digest IN ({','.join('?' * len(part))})",
+                        (category, *part),
+                    )
+                )
+            fresh = [(digest, line) for digest, line in batch.items() if digest not in seen]
+            conn.executemany(
+                "INSERT INTO account_index (category, digest) VALUES (?, ?)",
+                ((category, digest) for digest, _ in fresh),
+            )
+            conn.executemany(
+                "INSERT INTO account_queue (category, line) VALUES (?, ?)",
+                ((category, line) for _, line in fresh),
+            )
+            added = len(fresh)
+            self._set_count(category, self._counts.get(category, 0) + added)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._counts = dict(conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+            raise
+        return added
+
+    def _reserve(self, category: str, holder: int, now: float) -> AccountLease | None:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, line FROM account_queue WHERE category = ? ORDER BY id LIMIT 1", (category,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("DELETE FROM account_queue WHERE id = ?", (row[0],))
+            lease_id = conn.execute(
+                "INSERT INTO account_leases (account_id, category, line, holder, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (row[0], category, row[1], holder, now + self._lease_seconds),
+            ).lastrowid
+            remaining = self._counts.get(category, 1) - 1
+            self._set_count(category, remaining)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._counts = dict(conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+            raise
+        self._leased += 1
+        return AccountLease(lease_id, row[0], category, row[1], max(remaining, 0))
+
+    def _confirm(self, lease_id: int, account_id: int, category: str) -> bool:
+        if lease_id in self._cleared:
+            # The category was cleared mid-delivery; the account is gone either way
+            self._cleared.discard(lease_id)
+            return True
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            settled = conn.execute("DELETE FROM account_leases WHERE id = ?", (lease_id,)).rowcount
+            if settled:
+                self._leased -= 1
+            # Expired and reaped, but nobody has pulled it again yet: take it back off the queue
+            elif conn.execute("DELETE FROM account_queue WHERE id = ?", (account_id,)).rowcount:
+                self._set_count(category, self._counts.get(category, 1) - 1)
+                settled = 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._counts = dict(conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+            raise
+        return bool(settled)
+
+    def _restore(self, condition: str, params: tuple) -> int:
+        # Returned rows keep their original id, so they go back to the head of the queue
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, account_id, category, line FROM account_leases WHERE {condition}", params
+            ).fetchall()
+            conn.executemany(
+                "INSERT INTO account_queue (id, category, line) VALUES (?, ?, ?)", (row[1:] for row in rows)
+            )
+            conn.executemany("DELETE FROM account_leases WHERE id = ?", ((row[0],) for row in rows))
+            returned: dict[str, int] = {}
+            for _, _, category, _ in rows:
+                returned[category] = returned.get(category, 0) + 1
+            for category, added in returned.items():
+                self._set_count(category, self._counts.get(category, 0) + added)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._counts = dict(conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+            raise
+        self._leased -= len(rows)
+        return len(rows)
+
+    def _release(self, lease_id: int) -> int:
+        if lease_id in self._cleared:
+            # Don't refill a category that was cleared while this account was out
+            self._cleared.discard(lease_id)
+            return 0
+        return self._restore("id = ?", (lease_id,))
+
+    def _reap(self, now: float) -> int:
+        return self._restore("expires_at <= ?", (now,))
+
+    def _clear(self, category: str) -> int:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM account_queue WHERE category = ?", (category,)).rowcount
+            # Outstanding leases go too, or a release or the reaper would refill the category
+            leases = [row[0] for row in conn.execute("SELECT id FROM account_leases WHERE category = ?", (category,))]
+            conn.execute("DELETE FROM account_leases WHERE category = ?", (category,))
+            self._set_count(category, 0)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            self._counts = dict(conn.execute("SELECT category, remaining FROM account_counts WHERE remaining > 0"))
+            raise
+        self._leased -= len(leases)
+        self._cleared.update(leases)
+        return removed
+
+    async def push(self, category: str, lines: list[str]) -> int:
+        """Append ``lines`` to a category's queue, skipping any ever ingested before. Returns how many were added."""
+        return await self._run(self._push, category, lines)
+
+    async def reserve(self, category: str, holder: int) -> AccountLease | None:
+        """Lease the oldest account in a category to ``holder``; ``None`` when the category is empty."""
+        return await self._run(self._reserve, category, holder, time.time())
+
+    async def confirm(self, lease: AccountLease) -> bool:
+        """Settle a delivered lease. False means it expired and was already handed to someone else."""
+        return await self._run(self._confirm, lease.id, lease.account_id, lease.category)
+
+    async def release(self, lease: AccountLease) -> bool:
+        """Put an undelivered lease back at the head of its queue."""
+        return bool(await self._run(self._release, lease.id))
+
+    async def reap_expired(self) -> int:
+        """Return every expired lease to its queue and report how many there were."""
+        returned = await self._run(self._reap, time.time())
+        if returned:
+            log.warning(f"⚠️ Returned {returned} expired account lease(s) to their queues")
+        return returned
+
+    def start_reaper(self, interval: float = 15.0) -> None:
+        if self._reaper is not None and not self._reaper.done():
+            return
+
+        async def _loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.reap_expired()
+                except Exception as exc:
+                    log.warning(f"⚠️ Account lease reaper failed: {exc}")
+
+        self._reaper = asyncio.create_task(_loop())
 
+    async def clear(self, category: str) -> int:
+        """Drop every queued and leased account in a category and return how many queued ones were removed."""
+        return await self._run(self._clear, category)
 
-def save_accounts(accounts: dict[str, list[str]]) -> None:
-    """Persist the provided accounts dictionary to disk."""
-    with open(ACCOUNTS_FILE, 'w') as f:
-        json.dump(accounts, f, indent=2)
+    async def refresh(self) -> None:
+        """Re-read the in-memory counts after another instance may have written to the queue."""
+        await self._run(self._refresh)
+
+    def count(self, category: str) -> int:
+        return self._counts.get(category, 0)
+
+    def leased(self) -> int:
+        """Accounts currently reserved but not yet confirmed or returned."""
+        return self._leased
+
+    def counts(self) -> dict[str, int]:
+        """Remaining accounts per non-empty category (served from memory)."""
+        return dict(self._counts)
+
+
+def parse_account_chunk(text: str) -> list[str]:
+    """Extract and normalize every account line in a block of complete lines with one regex pass."""
+    # str.split() with no separator strips and collapses whitespace like normalize_account_line
+    return [" ".join(line.split()) for line in ACCOUNT_LINE_REGEX.findall(text)]
 
 
 def parse_accounts_from_text(raw_text: str) -> list[str]:
     """Extract account lines that contain an e-mail address from arbitrary text."""
-    parsed: list[str] = []
-    for line in raw_text.splitlines():
-        candidate = line.strip()
-        if not candidate:
-            continue
-        if EMAIL_REGEX.search(candidate):
-            parsed.append(normalize_account_line(candidate))
-    return parsed
+    return parse_account_chunk(raw_text)
+
+
+async def ingest_account_attachment(
+    attachment: discord.Attachment,
+    category_key: str,
+    on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+) -> tuple[int, int]:
+    """Stream an uploaded account dump into a category's queue chunk by chunk.
+
+    Only one chunk (plus a trailing partial line) is held in memory at a time.
+    Each block of complete lines is parsed in the default executor and pushed
+    before the next chunk is read, so large files never stall the gateway.
+    Returns ``(parsed, added)``.
+    """
+    loop = asyncio.get_running_loop()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    parsed_total = 0
+    added_total = 0
+
+    async def ingest(block: str) -> None:
+        nonlocal parsed_total, added_total
+        accounts = await loop.run_in_executor(None, parse_account_chunk, block)
+        if accounts:
+            parsed_total += len(accounts)
+            added_total += await account_queue.push(category_key, accounts)
+
+    carry = ""
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(BULKADD_CHUNK_SIZE):
+                text = carry + decoder.decode(chunk)
+                cut = text.rfind("\n") + 1
+                if cut == 0 and len(text) > BULKADD_CHUNK_SIZE * 4:
+                    # No line break in sight; don't let one runaway line grow without bound
+                    cut = len(text)
+                # The incomplete last line waits for the rest of it in the next chunk
+                carry = text[cut:]
+                if cut:
+                    await ingest(text[:cut])
+                if on_progress is not None:
+                    await on_progress(parsed_total, added_total)
+    carry += decoder.decode(b"", final=True)
+    if carry:
+        await ingest(carry)
+    return parsed_total, added_total
+
+
+class BarredUserRegistry:
+    """Set of barred user IDs kept in step with the barred_users document.
+
+    Checks are a plain set lookup; the storage layer refreshes the set whenever
+    the document is saved or edited on disk.
+    """
+
+    def __init__(self, store: DocumentStore, name: str = "barred_users"):
+        self._store = store
+        self._name = name
+        self._ids: frozenset[str] = frozenset()
+        store.subscribe(name, self._rebuild)
+
+    def _rebuild(self, data: dict) -> None:
+        self._ids = frozenset(str(entry) for entry in data.get("barred_users", []))
+
+    def snapshot(self) -> frozenset[str]:
+        return self._ids
+
+    def contains(self, user_id: int | str) -> bool:
+        return str(user_id) in self._ids
+
+    def replace(self, user_ids: set[str]) -> None:
+        """Persist a new set of IDs and update the in-memory view in place."""
+        self._store.put(self._name, {"barred_users": sorted(user_ids)})
+
+
+def _normalize_barred_users_document(data: Any) -> tuple[dict, bool]:
+    if not isinstance(data, dict) or not isinstance(data.get("barred_users"), list):
+        return {"barred_users": []}, True
+    return data, False
 
 
 def load_barred_users() -> set[str]:
-    """Load barred user IDs stored in the barred users config."""
-    ensure_barred_users_config_exists()
-    with open(BARRED_USERS_FILE, 'r') as f:
-        data = json.load(f)
-        return set(data.get("barred_users", []))
+    """Return the barred user IDs (served from memory, no disk access)."""
+    return set(barred_users_registry.snapshot())
 
 
 def is_user_barred(user_id: int) -> bool:
     """Return True if the given user_id is present in the barred users config."""
-    barred_ids = load_barred_users()
-    return str(user_id) in barred_ids
-
-
-def ensure_barred_users_config_exists():
-    """Ensure a JSON file exists to store barred user IDs."""
-    if not os.path.exists(BARRED_USERS_FILE):
-        with open(BARRED_USERS_FILE, 'w') as f:
-            json.dump({"barred_users": []}, f, indent=2)
+    return barred_users_registry.contains(user_id)
 
 
 def save_barred_users(user_ids: set[str]) -> None:
     """Persist the provided set of barred user IDs to disk."""
-    ensure_barred_users_config_exists()
-    with open(BARRED_USERS_FILE, 'w') as f:
-        json.dump({"barred_users": sorted(user_ids)}, f, indent=2)
+    barred_users_registry.replace(user_ids)
 
 
 def add_barred_user(user_id: int | str) -> None:
@@ -339,168 +1736,452 @@ def add_barred_user(user_id: int | str) -> None:
     if user_id_str not in barred_users:
         barred_users.add(user_id_str)
         save_barred_users(barred_users)
-        print(f"🚫 Added barred user ID: {user_id_str}")
+        log.info(f"🚫 Added barred user ID: {user_id_str}")
+
+
+class CommandMetrics:
+    """Per-command invocation counts and latency, fed from tree events.
+
+    The clock starts in the tree-wide interaction check (slash commands only;
+    autocomplete runs the same check) and stops in ``on_app_command_completion``,
+    ``on_app_command_error`` or the custom-command fallback.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self._registry = registry
+        self._started: dict[int, float] = {}
+
+    def begin(self, interaction: discord.Interaction) -> None:
+        if len(self._started) > 1000:
+            # Interactions that never completed (e.g. failed before dispatch) must not pile up
+            cutoff = time.perf_counter() - 900
+            self._started = {key: value for key, value in self._started.items() if value > cutoff}
+        self._started[interaction.id] = time.perf_counter()
+
+    def record(self, command: str, outcome: str, elapsed: float | None = None) -> None:
+        self._registry.inc("speedwagon_command_invocations_total", (("command", command), ("outcome", outcome)))
+        if elapsed is not None:
+            self._registry.observe("speedwagon_command_duration_seconds", elapsed, (("command", command),))
+
+    def finish(self, interaction: discord.Interaction, outcome: str, command: str | None = None) -> None:
+        started = self._started.pop(interaction.id, None)
+        if command is None:
+            command = interaction.command.qualified_name if interaction.command else "unknown"
+        elapsed = None if started is None else time.perf_counter() - started
+        self.record(command, outcome, elapsed)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "/%s %s", command, outcome,
+                extra={
+                    "command": command,
+                    "outcome": outcome,
+                    "guild": interaction.guild_id,
+                    "user": interaction.user.id if interaction.user else None,
+                    "latency_ms": None if elapsed is None else round(elapsed * 1000, 1),
+                },
+            )
+
+
+command_metrics = CommandMetrics(metrics)
 
 
 # Global command tree check to block barred users
 async def global_barred_user_check(interaction: discord.Interaction) -> bool:
     """Global slash-command check that blocks any barred user."""
     if interaction.user and is_user_barred(interaction.user.id):
+        command_name = (interaction.data or {}).get('name', 'unknown')
+        log.info(f"🚫 Silently ignoring interaction '{command_name}' from barred user {interaction.user.id}")
+        command_metrics.finish(interaction, "barred")
         # Returning False prevents the command from executing.
         return False
+    # Runs once per tree dispatch before any per-command check: start the clock
+    if interaction.type is discord.InteractionType.application_command:
+        command_metrics.begin(interaction)
     return True
 
 
+class ProviderRoleCache:
+    """Provider role ID per guild, resolved by name once and dropped on role events.
+
+    Membership is then an ID lookup on the member's role list instead of a
+    scan of every guild role followed by a scan of the member's roles.
+    """
+
+    def __init__(self, role_name: str = "Provider"):
+        self._role_name = role_name
+        self._role_ids: dict[int, int | None] = {}
+
+    def role_id(self, guild: discord.Guild) -> int | None:
+        try:
+            return self._role_ids[guild.id]
+        except KeyError:
+            role = discord.utils.get(guild.roles, name=self._role_name)
+            role_id = self._role_ids[guild.id] = role.id if role else None
+            return role_id
+
+    def invalidate(self, guild: discord.Guild) -> None:
+        self._role_ids.pop(guild.id, None)
+
+    def has_role(self, member: discord.abc.User) -> bool:
+        guild = getattr(member, "guild", None)
+        if guild is None:
+            return False
+        role_id = self.role_id(guild)
+        return role_id is not None and member.get_role(role_id) is not None
+
+
+provider_roles = ProviderRoleCache()
+
+
+class MissingProviderRole(app_commands.CheckFailure):
+    """Raised by ``require_provider`` checks; answered in ``on_app_command_error``."""
+
+    def __init__(self):
+        super().__init__("❌ You need the Provider role to use this command!")
+
+
+def require_provider():
+    """Command decorator: only members holding the guild's Provider role may run it.
+
+    Barred users never get this far; ``global_barred_user_check`` rejects them
+    once per interaction for the whole tree.
+    """
+
+    def predicate(interaction: discord.Interaction) -> bool:
+        if not provider_roles.has_role(interaction.user):
+            raise MissingProviderRole()
+        return True
+
+    return app_commands.check(predicate)
+
+
 # Simple email matcher used when parsing account dumps
 EMAIL_REGEX = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# Whole lines containing an e-mail address, matched across a multi-line block at once.
+# The address may only start where a run of local-part characters starts; otherwise
+# a long line without one is rescanned from every offset (quadratic in its length)
+ACCOUNT_LINE_REGEX = re.compile(rf"^[^\r\n]*?(?<![A-Za-z0-9._%+-]){EMAIL_REGEX.pattern}[^\r\n]*", re.MULTILINE)
+
+# Attachment imports for /bulkadd are read and parsed this many bytes at a time
+BULKADD_CHUNK_SIZE = 256 * 1024
+BULKADD_EXTENSIONS = ('.txt', '.csv')
+
+
+# Providers served by their own /<key> payment command: (key, display name)
+PAYMENT_PROVIDERS: tuple[tuple[str, str], ...] = (
+    ("neck", "Neck"),
+    ("eli", "Eli"),
+    ("angie", "Angie"),
+)
+
+# (key, /setlink choice name, /viewlinks label, embed field name, embed value template)
+PAYMENT_METHODS: tuple[tuple[str, str, str, str, str], ...] = (
+    ("apple_pay", "Apple Pay", "🍎 Apple Pay", "🍎 Apple Pay", "{link}"),
+    ("zelle", "Zelle", "💸 Zelle", "💸 Zelle", "[Send to Zelle]({link})"),
+    ("cashapp", "Cash App", "📱 Cash App", "📱 Cash App (Add 25¢ for fees)", "[Send via Cash App]({link})"),
+    ("credit", "Credit/Debit", "💳 Credit/Debit", "💳 Credit/Debit", "[Pay Online]({link})"),
+)
 
 
-# Save custom commands
-def save_custom_commands(commands_dict):
-    with open(COMMANDS_FILE, 'w') as f:
-        json.dump(commands_dict, f, indent=2)
+def _empty_provider_links() -> dict[str, str]:
+    return {method: "" for method, *_ in PAYMENT_METHODS}
+
+
+def _default_payment_links() -> dict[str, dict[str, str]]:
+    return {provider: _empty_provider_links() for provider, _ in PAYMENT_PROVIDERS}
 
 # Load payment links
 def load_payment_links():
-    try:
-        with open(LINKS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            "neck": {
-                "apple_pay": "",
-                "zelle": "",
-                "cashapp": "",
-                "credit": ""
-            },
-            "eli": {
-                "apple_pay": "",
-                "zelle": "",
-                "cashapp": "",
-                "credit": ""
-            },
-            "angie": {
-                "apple_pay": "",
-                "zelle": "",
-                "cashapp": "",
-                "credit": ""
-            }
-        }
+    return storage.get("payment_links")
 
-# Save payment links
-def save_payment_links(links_dict):
-    with open(LINKS_FILE, 'w') as f:
-        json.dump(links_dict, f, indent=2)
 
-# Load enjoy messages
-def load_enjoy_messages():
-    try:
-        with open(ENJOY_FILE, 'r') as f:
-            data = json.load(f)
-            # Auto-heal: ensure the stored prompts keep the GUHDeats branding + reminders intact
-            if _needs_enjoy_update(data):
-                healed = {"messages": DEFAULT_ENJOY_MESSAGES, "index": 0}
-                save_enjoy_messages(healed)
-                print("🔧 Auto-updated enjoy_messages.json with refreshed GUHDeats promos")
-                return healed
-            return data
-    except FileNotFoundError:
-        default_data = {"messages": DEFAULT_ENJOY_MESSAGES, "index": 0}
-        save_enjoy_messages(default_data)
-        return default_data
-
-# Save enjoy messages
-def save_enjoy_messages(enjoy_data):
-    with open(ENJOY_FILE, 'w') as f:
-        json.dump(enjoy_data, f, indent=2)
-
-# Initialize data files
-if not os.path.exists(COMMANDS_FILE):
-    save_custom_commands({})
-
-if not os.path.exists(LINKS_FILE):
-    save_payment_links({
-        "neck": {
-            "apple_pay": "",
-            "zelle": "",
-            "cashapp": "",
-            "credit": ""
-        },
-        "eli": {
-            "apple_pay": "",
-            "zelle": "",
-            "cashapp": "",
-            "credit": ""
-        },
-        "angie": {
-            "apple_pay": "",
-            "zelle": "",
-            "cashapp": "",
-            "credit": ""
+def set_payment_link(provider: str, method: str, value: str) -> None:
+    links = dict(load_payment_links().get(provider) or _empty_provider_links())
+    links[method] = value
+    storage.apply("payment_links", {"op": "set", "key": provider, "value": links})
+
+
+def render_payment_embed(display_name: str, links: dict[str, str]) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"💳 Payment Methods - {display_name}",
+        description="Here are our accepted payment methods:",
+        color=0x0099ff
+    )
+
+    # Add fields only if links are set
+    for method, _, _, field_name, value_template in PAYMENT_METHODS:
+        link = links.get(method)
+        if link:
+            embed.add_field(name=field_name, value=value_template.format(link=link), inline=False)
+
+    # If no links are set, show a message
+    if not any(links.values()):
+        embed.add_field(
+            name="⚠️ No Payment Links Set",
+            value="Contact an admin to set up payment methods using `/setlink`",
+            inline=False
+        )
+
+    embed.set_footer(text="Contact support if you need help with payment!")
+    return embed
+
+
+class PaymentEmbedCache:
+    """Pre-rendered payment embeds, one per provider in ``PAYMENT_PROVIDERS``.
+
+    Rebuilt from the payment_links document whenever it changes (``/setlink``
+    or an edit on disk), so serving a payment command is a dict lookup.
+    """
+
+    def __init__(self, store: DocumentStore, name: str = "payment_links"):
+        self._embeds: dict[str, discord.Embed] = {}
+        store.subscribe(name, self._rebuild)
+
+    def _rebuild(self, data: dict) -> None:
+        self._embeds = {
+            provider: render_payment_embed(display_name, data.get(provider) or {})
+            for provider, display_name in PAYMENT_PROVIDERS
         }
-    })
 
-# Initialize enjoy messages file
-if not os.path.exists(ENJOY_FILE):
-    save_enjoy_messages({
-        "messages": DEFAULT_ENJOY_MESSAGES,
-        "index": 0,
+    def get(self, provider: str) -> discord.Embed:
+        return self._embeds[provider]
+
+
+def _default_enjoy_document() -> dict:
+    return {"messages": list(DEFAULT_ENJOY_MESSAGES), "index": 0}
+
+
+def _normalize_enjoy_document(data: Any) -> tuple[dict, bool]:
+    # Auto-heal: ensure the stored prompts keep the GUHDeats branding + reminders intact
+    if _needs_enjoy_update(data):
+        log.info("🔧 Auto-updated enjoy_messages.json with refreshed GUHDeats promos")
+        return _default_enjoy_document(), True
+    return data, False
+
+
+# Placeholders an enjoy template may contain, mapped to the value that replaces them.
+# Longer spellings come first so '#vouch-📸' isn't consumed as '#vouch' + '-📸'.
+ENJOY_PLACEHOLDERS: dict[str, str] = {
+    "(user)": "user",
+    "#vouch-📸": "vouch",
+    "#vouch": "vouch",
+    "#♠♥casino♣♦": "casino",
+    "#casino": "casino",
+}
+ENJOY_PLACEHOLDER_REGEX = re.compile("|".join(re.escape(token) for token in ENJOY_PLACEHOLDERS))
+
+
+class EnjoyTemplate:
+    """An enjoy message split into literal text and placeholder slots."""
+
+    __slots__ = ("source", "parts", "slots")
+
+    def __init__(self, source: str):
+        self.source = source
+        parts: list[str] = []
+        slots: list[tuple[int, str]] = []
+        position = 0
+        for match in ENJOY_PLACEHOLDER_REGEX.finditer(source):
+            if match.start() > position:
+                parts.append(source[position:match.start()])
+            # Keep the raw token in place so an unresolved slot renders unchanged
+            slots.append((len(parts), ENJOY_PLACEHOLDERS[match.group()]))
+            parts.append(match.group())
+            position = match.end()
+        if position < len(source):
+            parts.append(source[position:])
+        self.parts = tuple(parts)
+        self.slots = tuple(slots)
+
+    def render(self, values: dict[str, str | None]) -> str:
+        parts = list(self.parts)
+        for index, key in self.slots:
+            value = values.get(key)
+            if value is not None:
+                parts[index] = value
+        return "".join(parts)
+
+
+class EnjoyTemplateCache:
+    """Compiled enjoy templates, rebuilt only when the message list itself changes.
+
+    The rotation position lives in :class:`RotationCounters`, not in this
+    document; the listener still compares the messages list by identity so
+    saves that leave the list alone don't trigger a recompile.
+    """
+
+    def __init__(self, store: DocumentStore, name: str = "enjoy_messages"):
+        self._source: list[str] | None = None
+        self._templates: tuple[EnjoyTemplate, ...] = ()
+        store.subscribe(name, self._rebuild)
+
+    def _rebuild(self, data: dict) -> None:
+        messages = data.get("messages") or []
+        if messages is self._source:
+            return
+        self._templates = tuple(EnjoyTemplate(message) for message in messages)
+        self._source = messages
+
+    def templates(self) -> tuple[EnjoyTemplate, ...]:
+        return self._templates
+
+
+def _default_welcome_document() -> dict:
+    return {"messages": list(DEFAULT_WELCOME_MESSAGES), "index": 0}
+
+
+def _normalize_welcome_document(data: Any) -> tuple[dict, bool]:
+    if not isinstance(data, dict) or _needs_welcome_update(data):
+        log.info("🔧 Auto-updated welcome_messages.json to spotlight latest promos")
+        return _default_welcome_document(), True
+    return data, False
+
+# Rotation cursors persisted in rotation_state.bin, one little-endian uint64 per slot
+ROTATION_SLOTS = ("enjoy", "welcome")
+_ROTATION_RECORD = struct.Struct("<" + "Q" * len(ROTATION_SLOTS))
+
+
+class RotationCounters:
+    """Monotonic rotation cursors for the enjoy and welcome messages.
+
+    ``next()`` hands every caller a distinct value straight from memory, so
+    concurrent invocations never repeat a message and a rotation step does no
+    I/O. The storage writer thread rewrites the whole fixed-size record in
+    place when it has changed; losing the last couple of seconds of progress
+    on a crash only means a message may be repeated.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._positions = {slot: position for position, slot in enumerate(ROTATION_SLOTS)}
+        self._values = [0] * len(ROTATION_SLOTS)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._file = None
+
+    def load(self, seeds: dict[str, int]) -> None:
+        """Read persisted cursors, falling back to ``seeds`` (the legacy per-document indexes)."""
+        try:
+            with open(self._path, 'rb') as f:
+                raw = f.read(_ROTATION_RECORD.size)
+        except FileNotFoundError:
+            raw = b""
+        if len(raw) == _ROTATION_RECORD.size:
+            self._values = list(_ROTATION_RECORD.unpack(raw))
+            return
+        self._values = [max(int(seeds.get(slot, 0) or 0), 0) for slot in ROTATION_SLOTS]
+        self._dirty = True
+
+    def reload(self) -> None:
+        """Adopt cursors another instance persisted, e.g. when taking over as leader."""
+        try:
+            with open(self._path, 'rb') as f:
+                raw = f.read(_ROTATION_RECORD.size)
+        except FileNotFoundError:
+            return
+        if len(raw) == _ROTATION_RECORD.size:
+            with self._lock:
+                self._values = list(_ROTATION_RECORD.unpack(raw))
+                self._dirty = False
+
+    def next(self, slot: str) -> int:
+        position = self._positions[slot]
+        with self._lock:
+            value = self._values[position]
+            self._values[position] = value + 1
+            self._dirty = True
+        return value
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            raw = _ROTATION_RECORD.pack(*self._values)
+            self._dirty = False
+        try:
+            if self._file is None:
+                self._file = open(self._path, 'r+b' if os.path.exists(self._path) else 'w+b')
+            self._file.seek(0)
+            self._file.write(raw)
+            self._file.flush()
+        except OSError as exc:
+            log.warning(f"⚠️ Failed to persist rotation state to {self._path}: {exc}")
+            with self._lock:
+                self._dirty = True
+
+
+def open_documents() -> None:
+    """Move legacy root files into DATA_DIR, load every JSON document and start the writer."""
+    migrate_legacy_file('custom_commands.json', COMMANDS_FILE)
+    migrate_legacy_file('payment_links.json', LINKS_FILE)
+    migrate_legacy_file('enjoy_messages.json', ENJOY_FILE)
+    if shared_store_enabled():
+        storage.use_database(SharedDocumentDatabase(DATABASE_FILE))
+    storage.register("custom_commands", COMMANDS_FILE, dict)
+    storage.register("payment_links", LINKS_FILE, _default_payment_links)
+    storage.register("enjoy_messages", ENJOY_FILE, _default_enjoy_document, _normalize_enjoy_document)
+    storage.register("welcome_messages", WELCOME_FILE, _default_welcome_document, _normalize_welcome_document)
+    storage.register("command_sync", COMMAND_SYNC_FILE, dict)
+    storage.register("barred_users", BARRED_USERS_FILE, lambda: {"barred_users": []}, _normalize_barred_users_document)
+    storage.register("business_status", BUSINESS_STATUS_FILE, dict)
+    storage.preload()
+    storage.start()
+    runtime_health.add_readiness_check("storage", storage.health_problem)
+
+
+# Created by bootstrap(); importing the module opens nothing
+account_queue: AccountQueueStore | None = None
+rotation_counters: RotationCounters | None = None
+custom_command_table: CustomCommandTable | None = None
+enjoy_templates: EnjoyTemplateCache | None = None
+payment_embeds: PaymentEmbedCache | None = None
+barred_users_registry: BarredUserRegistry | None = None
+
+
+def open_account_queue() -> None:
+    global account_queue
+    account_queue = AccountQueueStore(DATABASE_FILE, lease_seconds=_resolve_int_env("ACCOUNT_LEASE_SECONDS", 60))
+    account_queue.open()
+
+
+def load_rotation_counters() -> None:
+    """Restore rotation positions, seeded from the indexes the JSON documents used to carry."""
+    global rotation_counters
+    rotation_counters = RotationCounters(ROTATION_FILE)
+    rotation_counters.load({
+        "enjoy": storage.get("enjoy_messages").get("index", 0),
+        "welcome": storage.get("welcome_messages").get("index", 0),
     })
+    storage.add_flush_hook(rotation_counters.flush)
 
-if not os.path.exists(WELCOME_FILE):
-    with open(WELCOME_FILE, 'w') as f:
-        json.dump({"messages": DEFAULT_WELCOME_MESSAGES, "index": 0}, f, indent=2)
 
-if not os.path.exists(ACCOUNTS_FILE):
-    save_accounts({})
+def build_document_views() -> None:
+    """Subscribe the in-memory lookup tables to their documents and seed the default barred IDs."""
+    global custom_command_table, enjoy_templates, payment_embeds, barred_users_registry
+    custom_command_table = CustomCommandTable(storage)
+    enjoy_templates = EnjoyTemplateCache(storage)
+    payment_embeds = PaymentEmbedCache(storage)
+    barred_users_registry = BarredUserRegistry(storage)
+    for default_barred_id in DEFAULT_BARRED_USERS:
+        add_barred_user(default_barred_id)
 
-# Ensure barred users config exists and seed default barred IDs
-ensure_barred_users_config_exists()
-for default_barred_id in DEFAULT_BARRED_USERS:
-    add_barred_user(default_barred_id)
 
 # Register the check via the tree's interaction_check hook
 bot.tree.interaction_check = global_barred_user_check
-print("✅ Registered global barred user check for command tree")
+log.info("✅ Registered global barred user check for command tree")
 
 
 def load_welcome_messages() -> dict:
-    try:
-        with open(WELCOME_FILE, 'r') as f:
-            data = json.load(f)
-            if _needs_welcome_update(data):
-                healed = {"messages": DEFAULT_WELCOME_MESSAGES, "index": 0}
-                save_welcome_messages(healed)
-                print("🔧 Auto-updated welcome_messages.json to spotlight latest promos")
-                return healed
-            messages = data.get("messages", [])
-            if not messages:
-                data = {"messages": DEFAULT_WELCOME_MESSAGES, "index": 0}
-                save_welcome_messages(data)
-            return data
-    except FileNotFoundError:
-        data = {"messages": DEFAULT_WELCOME_MESSAGES, "index": 0}
-        save_welcome_messages(data)
-        return data
-
+    return storage.get("welcome_messages")
 
-def save_welcome_messages(data: dict) -> None:
-    with open(WELCOME_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
 
-
-def get_next_welcome_message(member: discord.Member) -> str | None:
-    if member.bot:
-        return None
+def render_welcome_message(guild: discord.Guild | None, mentions: str) -> str | None:
     data = load_welcome_messages()
     messages: list[str] = data.get("messages", DEFAULT_WELCOME_MESSAGES)
     if not messages:
         return None
-    index = data.get("index", 0) % len(messages)
-    template = messages[index]
-    data["index"] = (index + 1) % len(messages)
-    save_welcome_messages(data)
-    base_line = template.replace("(user)", member.mention)
+    template = messages[rotation_counters.next("welcome") % len(messages)]
+    base_line = template.replace("(user)", mentions)
 
     now_hour = time.localtime().tm_hour
     slot = _time_slot_from_hour(now_hour)
@@ -508,8 +2189,8 @@ def get_next_welcome_message(member: discord.Member) -> str | None:
 
     extras: list[str] = [time_variant]
 
-    if member.guild and member.guild.member_count:
-        count_formatted = f"{member.guild.member_count:,}"
+    if guild and guild.member_count:
+        count_formatted = f"{guild.member_count:,}"
         extras.append(random.choice(MEMBER_COUNT_SNIPPETS).format(count=count_formatted))
 
     extras.append(random.choice(WELCOME_ROLLOUT_SNIPPETS))
@@ -517,215 +2198,1310 @@ def get_next_welcome_message(member: discord.Member) -> str | None:
     return "\n".join([base_line] + extras)
 
 
-@bot.event
-async def on_member_join(member: discord.Member):
-    welcome_line = get_next_welcome_message(member)
-    if not welcome_line:
-        return
-    guild = member.guild
-    if guild is None:
-        return
+class _GuildNameIndex:
+    __slots__ = ("members_by_key", "keys_by_member", "sorted_keys")
 
-    fallback_channels: list[discord.abc.MessageableChannel] = []
+    def __init__(self):
+        self.members_by_key: dict[str, set[int]] = {}
+        self.keys_by_member: dict[int, tuple[str, ...]] = {}
+        self.sorted_keys: list[str] = []
 
-    system_channel = getattr(guild, "system_channel", None)
-    if system_channel is not None:
-        fallback_channels.append(system_channel)
 
-    preferred_names = ("welcome", "introductions", "general")
-    for name in preferred_names:
-        channel = discord.utils.get(guild.text_channels, name=name)
-        if channel is not None and channel not in fallback_channels:
-            fallback_channels.append(channel)
+class MemberNameIndex:
+    """Per-guild lookup from casefolded display name / username to members.
 
-    if not fallback_channels:
-        bot_member = getattr(guild, "me", None) or guild.get_member(bot.user.id)
-        for channel in guild.text_channels:
-            try:
-                if bot_member and channel.permissions_for(bot_member).send_messages:
-                    fallback_channels.append(channel)
-                    break
-            except Exception:
-                continue
+    Built once per guild on first use and kept current from member events, so
+    resolving a typed name is a dict probe and prefix completion is a bisect
+    into a sorted key list instead of a walk over ``guild.members``.
+    """
 
-    for channel in fallback_channels:
-        try:
-            await channel.send(welcome_line)
-            return
-        except Exception as channel_exc:
-            print(
-                "⚠️ Failed to deliver welcome message for %s via %s: %s"
-                % (member.id, getattr(channel, "name", "unknown"), channel_exc)
-            )
+    def __init__(self):
+        self._guilds: dict[int, _GuildNameIndex] = {}
 
-    if not fallback_channels:
-        print(f"⚠️ Failed to deliver welcome message for {member.id}: no accessible channel")
+    @staticmethod
+    def _keys_for(member: discord.Member) -> tuple[str, ...]:
+        return tuple({member.display_name.casefold(), member.name.casefold()})
 
+    def _index_for(self, guild: discord.Guild) -> _GuildNameIndex:
+        index = self._guilds.get(guild.id)
+        if index is None:
+            index = self.rebuild(guild)
+        return index
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user} has connected to Discord!')
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+    def rebuild(self, guild: discord.Guild) -> _GuildNameIndex:
+        index = _GuildNameIndex()
+        for member in guild.members:
+            keys = self._keys_for(member)
+            index.keys_by_member[member.id] = keys
+            for key in keys:
+                index.members_by_key.setdefault(key, set()).add(member.id)
+        index.sorted_keys = sorted(index.members_by_key)
+        self._guilds[guild.id] = index
+        return index
+
+    def _discard(self, index: _GuildNameIndex, member_id: int) -> None:
+        for key in index.keys_by_member.pop(member_id, ()):
+            owners = index.members_by_key.get(key)
+            if owners is None:
+                continue
+            owners.discard(member_id)
+            if not owners:
+                del index.members_by_key[key]
+                position = bisect.bisect_left(index.sorted_keys, key)
+                if position < len(index.sorted_keys) and index.sorted_keys[position] == key:
+                    del index.sorted_keys[position]
+
+    def add(self, member: discord.Member) -> None:
+        index = self._guilds.get(member.guild.id)
+        if index is None:
+            # Not built yet; the first lookup indexes the whole guild including this member
+            return
+        self._discard(index, member.id)
+        keys = self._keys_for(member)
+        index.keys_by_member[member.id] = keys
+        for key in keys:
+            owners = index.members_by_key.get(key)
+            if owners is None:
+                index.members_by_key[key] = {member.id}
+                bisect.insort(index.sorted_keys, key)
+            else:
+                owners.add(member.id)
+
+    def remove(self, member: discord.Member) -> None:
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            self._discard(index, member.id)
+
+    def forget_guild(self, guild: discord.Guild) -> None:
+        self._guilds.pop(guild.id, None)
+
+    def resolve(self, guild: discord.Guild, query: str) -> discord.Member | None:
+        """Return the member whose display name or username equals ``query`` (case-insensitive)."""
+        owners = self._index_for(guild).members_by_key.get(query.casefold())
+        if not owners:
+            return None
+        for member_id in sorted(owners):
+            member = guild.get_member(member_id)
+            if member is not None:
+                return member
+        return None
+
+    def complete(self, guild: discord.Guild, prefix: str, limit: int = 25) -> list[discord.Member]:
+        """Members with a display name or username starting with ``prefix``, at most ``limit``."""
+        index = self._index_for(guild)
+        needle = prefix.casefold()
+        keys = index.sorted_keys
+        results: list[discord.Member] = []
+        seen: set[int] = set()
+        position = bisect.bisect_left(keys, needle)
+        while position < len(keys) and keys[position].startswith(needle) and len(results) < limit:
+            for member_id in sorted(index.members_by_key[keys[position]]):
+                if member_id in seen:
+                    continue
+                member = guild.get_member(member_id)
+                if member is not None:
+                    seen.add(member_id)
+                    results.append(member)
+                    if len(results) >= limit:
+                        break
+            position += 1
+        return results
+
+
+member_index = MemberNameIndex()
+
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    member_index.remove(member)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.display_name != after.display_name or before.name != after.name:
+        member_index.add(after)
+
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User):
+    # Username / global display name changes apply to every guild the user shares with us
+    if before.name == after.name and before.display_name == after.display_name:
+        return
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member is not None:
+            member_index.add(member)
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    member_index.forget_guild(guild)
+    provider_roles.invalidate(guild)
+
+
+STATUS_CHANNEL_MARKERS = ("open", "closed", "pause")
+STATUS_CHANNEL_EMOJIS = ("🟢", "🔴", "🟡")
+WELCOME_CHANNEL_NAMES = ("welcome", "introductions", "general")
+
+
+def is_status_channel_name(name: str) -> bool:
+    lowered = name.lower()
+    return any(marker in lowered for marker in STATUS_CHANNEL_MARKERS) or any(emoji in name for emoji in STATUS_CHANNEL_EMOJIS)
+
+
+class GuildChannelTargets:
+    """The channels a guild's logical targets currently resolve to."""
+
+    __slots__ = ("vouch", "casino", "order_here", "status", "welcome")
+
+    def __init__(self):
+        self.vouch: discord.TextChannel | None = None
+        self.casino: discord.TextChannel | None = None
+        self.order_here: discord.abc.GuildChannel | None = None
+        self.status: tuple[discord.abc.GuildChannel, ...] = ()
+        self.welcome: tuple[discord.abc.Messageable, ...] = ()
+
+
+class ChannelDirectory:
+    """Per-guild cache of the channels the bot's commands talk about.
+
+    Targets are resolved in one walk over the guild's channels the first time
+    they're needed and reused until a channel, role or guild event invalidates
+    them, so hot commands never scan ``guild.channels`` themselves.
+    """
+
+    def __init__(self):
+        self._targets: dict[int, GuildChannelTargets] = {}
+
+    def get(self, guild: discord.Guild) -> GuildChannelTargets:
+        targets = self._targets.get(guild.id)
+        if targets is None:
+            targets = self._resolve(guild)
+            self._targets[guild.id] = targets
+        return targets
+
+    def invalidate(self, guild: discord.Guild | None) -> None:
+        if guild is not None:
+            self._targets.pop(guild.id, None)
+
+    @staticmethod
+    def _resolve(guild: discord.Guild) -> GuildChannelTargets:
+        targets = GuildChannelTargets()
+        vouch_fallback = casino_fallback = None
+        named: dict[str, discord.TextChannel] = {}
+        for channel in guild.text_channels:
+            lowered = channel.name.lower()
+            # Prefer exact channel names, then any channel containing the keyword
+            if channel.name == 'vouch-📸' and targets.vouch is None:
+                targets.vouch = channel
+            elif vouch_fallback is None and 'vouch' in lowered:
+                vouch_fallback = channel
+            if channel.name == '♠♥casino♣♦' and targets.casino is None:
+                targets.casino = channel
+            elif casino_fallback is None and 'casino' in lowered:
+                casino_fallback = channel
+            if channel.name in WELCOME_CHANNEL_NAMES:
+                named.setdefault(channel.name, channel)
+        targets.vouch = targets.vouch or vouch_fallback
+        targets.casino = targets.casino or casino_fallback
+
+        status: list[discord.abc.GuildChannel] = []
+        for channel in guild.channels:
+            if is_status_channel_name(channel.name):
+                status.append(channel)
+            if targets.order_here is None and "order-here" in channel.name.lower():
+                targets.order_here = channel
+        targets.status = tuple(status)
+
+        welcome: list[discord.abc.Messageable] = []
+        system_channel = getattr(guild, "system_channel", None)
+        if system_channel is not None:
+            welcome.append(system_channel)
+        for name in WELCOME_CHANNEL_NAMES:
+            channel = named.get(name)
+            if channel is not None and channel not in welcome:
+                welcome.append(channel)
+        if not welcome:
+            bot_member = getattr(guild, "me", None) or (guild.get_member(bot.user.id) if bot.user else None)
+            for channel in guild.text_channels:
+                try:
+                    if bot_member and channel.permissions_for(bot_member).send_messages:
+                        welcome.append(channel)
+                        break
+                except Exception:
+                    continue
+        targets.welcome = tuple(welcome)
+        return targets
+
+
+channel_directory = ChannelDirectory()
+
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    channel_directory.invalidate(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    channel_directory.invalidate(channel.guild)
+
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    channel_directory.invalidate(after.guild)
+    channel_renames.forget(after.id)
+
+
+@bot.event
+async def on_guild_update(before: discord.Guild, after: discord.Guild):
+    # The system channel may have moved
+    channel_directory.invalidate(after)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    # Permission changes can alter which channel the welcome fallback may post in
+    channel_directory.invalidate(after.guild)
+    # The Provider role may have been renamed to or from "Provider"
+    provider_roles.invalidate(after.guild)
+
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    provider_roles.invalidate(role.guild)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    provider_roles.invalidate(role.guild)
+
+
+class ChannelRenameScheduler:
+    """Applies status-channel renames concurrently, keeping only the latest target.
+
+    Discord allows two renames per channel every ten minutes and discord.py
+    waits out the 429 inside ``channel.edit``. Each channel therefore gets one
+    worker task and a single "desired name" slot: a request made while an edit
+    is in flight just replaces the slot, so open -> pause -> open applies at
+    most the one rename still needed once the in-flight edit finishes, and a
+    request for the name the channel already has costs nothing.
+    """
+
+    def __init__(self):
+        self._desired: dict[int, str] = {}
+        self._applied: dict[int, str] = {}
+        self._waiters: dict[int, list[asyncio.Future]] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    def current_name(self, channel: discord.abc.GuildChannel) -> str:
+        return self._applied.get(channel.id, channel.name)
+
+    def forget(self, channel_id: int) -> None:
+        # The gateway copy is authoritative again once Discord echoes the update
+        self._applied.pop(channel_id, None)
+
+    def request(self, channel: discord.abc.GuildChannel, name: str) -> asyncio.Future:
+        """Schedule ``channel`` to be named ``name``.
+
+        The returned future resolves to ``True`` once a rename was applied and
+        ``False`` when no edit was needed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if channel.id not in self._workers and self.current_name(channel) == name:
+            future.set_result(False)
+            return future
+
+        self._desired[channel.id] = name
+        self._waiters.setdefault(channel.id, []).append(future)
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel))
+        return future
+
+    async def _drain(self, channel: discord.abc.GuildChannel) -> None:
+        changed = False
+        try:
+            while channel.id in self._desired:
+                name = self._desired.pop(channel.id)
+                if self.current_name(channel) == name:
+                    continue
+                updated = await channel.edit(name=name)
+                self._applied[channel.id] = getattr(updated, "name", None) or name
+                changed = True
+        except Exception as exc:
+            self._desired.pop(channel.id, None)
+            self._resolve(channel.id, exc=exc)
+        else:
+            self._resolve(channel.id, result=changed)
+        finally:
+            self._workers.pop(channel.id, None)
+
+    def _resolve(self, channel_id: int, result: bool = False, exc: BaseException | None = None) -> None:
+        for future in self._waiters.pop(channel_id, []):
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    async def apply(
+        self,
+        channels: tuple[discord.abc.GuildChannel, ...],
+        name: str,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+        timeout: float = 8.0,
+    ) -> tuple[int, int, int]:
+        """Rename every channel in ``channels`` and wait up to ``timeout`` seconds.
+
+        Returns ``(renamed, unchanged, still_queued)``. Queued renames keep
+        running in the background after this returns; the first edit error
+        (e.g. ``discord.Forbidden``) is re-raised.
+        """
+        futures = [self.request(channel, name) for channel in channels]
+        pending = {future for future in futures if not future.done()}
+        deadline = asyncio.get_running_loop().time() + timeout
+        total = len(futures)
+
+        while pending:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            _, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if pending and on_progress is not None:
+                await on_progress(total - len(pending), total)
+
+        renamed = unchanged = 0
+        for future in futures:
+            if not future.done():
+                continue
+            if future.exception() is not None:
+                raise future.exception()
+            if future.result():
+                renamed += 1
+            else:
+                unchanged += 1
+        return renamed, unchanged, len(pending)
+
+
+channel_renames = ChannelRenameScheduler()
+
+
+def describe_rename_result(name: str, renamed: int, unchanged: int, queued: int) -> str:
+    if queued:
+        return (
+            f"- {renamed + unchanged} status channel(s) set to {name}, "
+            f"{queued} queued behind Discord's rename limit (will apply automatically)"
+        )
+    if not renamed:
+        return f"- Status channels already showed {name}"
+    return f"- All status channels renamed to {name}"
+
+
+BUSINESS_STATES: dict[str, dict[str, str]] = {
+    "open": {
+        "verb": "Opening",
+        "headline": "✅ Business is now **OPEN**! 🟢",
+        "order_changed": "- Order-here channel is now read-only (view + react, no sending)",
+        "order_unchanged": "- Order-here channel was already read-only (view + react, no sending)",
+    },
+    "closed": {
+        "verb": "Closing",
+        "headline": "✅ Business is now **CLOSED**! 🔴",
+        "order_changed": "- Order-here channel is now private (no view, send, or history)",
+        "order_unchanged": "- Order-here channel was already private (no view, send, or history)",
+    },
+    "paused": {
+        "verb": "Pausing",
+        "headline": "✅ Business is now **PAUSED**! 🟡",
+        "order_changed": "- Order-here channel is now private",
+        "order_unchanged": "- Order-here channel was already private",
+    },
+}
+SCHEDULE_TIME_REGEX = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def status_channel_name(state: str, message: str | None = None) -> str:
+    if state == "open":
+        return "🟢-open"
+    if state == "closed":
+        return "🔴-closed"
+    # Format: 🟡-{message} with spaces replaced by hyphens (message first for visibility)
+    return f"🟡-{(message or 'paused').replace(' ', '-')}"
+
+
+def order_channel_overwrite(state: str, current: discord.PermissionOverwrite) -> discord.PermissionOverwrite:
+    """The @everyone overwrite order-here should carry in ``state``."""
+    if state == "open":
+        # Keep whatever else is set; @everyone can view and react, but cannot send messages
+        allow, deny = current.pair()
+        overwrite = discord.PermissionOverwrite.from_pair(allow, deny)
+        overwrite.view_channel = True
+        overwrite.send_messages = False
+        overwrite.add_reactions = True
+        return overwrite
+    # Closed and paused both hide the channel outright
+    return discord.PermissionOverwrite(view_channel=False, send_messages=False, read_message_history=False)
+
+
+def _resolve_business_timezone() -> datetime.tzinfo | None:
+    name = os.getenv("BUSINESS_TIMEZONE")
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        log.warning(f"⚠️ Invalid BUSINESS_TIMEZONE value '{name}': {exc}. Falling back to server local time.")
+        return None
+
+
+class StatusTransition:
+    """What a business-status transition changed."""
+
+    __slots__ = ("state", "channel_name", "renamed", "unchanged", "queued", "permissions_changed", "missing")
+
+    def __init__(self, state: str, channel_name: str):
+        self.state = state
+        self.channel_name = channel_name
+        self.renamed = 0
+        self.unchanged = 0
+        self.queued = 0
+        self.permissions_changed = False
+        self.missing: str | None = None
+
+    @property
+    def api_calls(self) -> int:
+        return self.renamed + self.queued + int(self.permissions_changed)
+
+
+class BusinessStatusEngine:
+    """Persisted open/closed/paused state per guild, applied as a minimal diff.
+
+    Each guild's record in the ``business_status`` document holds the current
+    state, the status and order-here channel IDs it was last applied to and the
+    @everyone overwrite written to order-here. A transition compares the
+    desired channel names and overwrite against the cached live channels and
+    only issues the renames and ``set_permissions`` call that change
+    something, so repeating ``/open`` costs no API calls. The optional daily
+    timetable drives the same ``transition`` path.
+    """
+
+    def __init__(self, store: DocumentStore, directory: ChannelDirectory, renames: ChannelRenameScheduler):
+        self._store = store
+        self._directory = directory
+        self._renames = renames
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._scheduler: asyncio.Task | None = None
+
+    @functools.cached_property
+    def _timezone(self) -> datetime.tzinfo | None:
+        # Resolved on first use, after bootstrap has loaded .env
+        return _resolve_business_timezone()
+
+    def record(self, guild_id: int) -> dict:
+        return self._store.get("business_status").get(str(guild_id), {})
+
+    def _save(self, guild_id: int, record: dict) -> None:
+        self._store.apply("business_status", {"op": "set", "key": str(guild_id), "value": record})
+
+    def _status_channels(self, guild: discord.Guild, record: dict) -> tuple[discord.abc.GuildChannel, ...]:
+        channels: dict[int, discord.abc.GuildChannel] = {}
+        for channel_id in record.get("status_channel_ids", ()):
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                channels[channel.id] = channel
+        # Newly created status channels are picked up from the (cached) directory
+        for channel in self._directory.get(guild).status:
+            channels.setdefault(channel.id, channel)
+        return tuple(channels.values())
+
+    def _order_channel(self, guild: discord.Guild, record: dict) -> discord.abc.GuildChannel | None:
+        channel_id = record.get("order_channel_id")
+        channel = guild.get_channel(channel_id) if channel_id else None
+        return channel or self._directory.get(guild).order_here
+
+    @staticmethod
+    async def _apply_overwrite(channel: discord.abc.GuildChannel, role: discord.Role, state: str) -> tuple[bool, discord.PermissionOverwrite]:
+        current = channel.overwrites_for(role)
+        desired = order_channel_overwrite(state, current)
+        if desired == current:
+            return False, desired
+        await channel.set_permissions(role, overwrite=desired)
+        return True, desired
+
+    async def transition(
+        self,
+        guild: discord.Guild,
+        state: str,
+        message: str | None = None,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> StatusTransition:
+        if state not in BUSINESS_STATES:
+            raise ValueError(f"Unknown business state: {state}")
+        lock = self._locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            record = self.record(guild.id)
+            result = StatusTransition(state, status_channel_name(state, message))
+
+            status_channels = self._status_channels(guild, record)
+            if not status_channels:
+                result.missing = "status"
+                return result
+
+            renames = self._renames.apply(status_channels, result.channel_name, on_progress=on_progress)
+            order_channel = self._order_channel(guild, record)
+            overwrite = None
+            if order_channel is None:
+                result.renamed, result.unchanged, result.queued = await renames
+                result.missing = "order"
+            else:
+                (result.renamed, result.unchanged, result.queued), (result.permissions_changed, overwrite) = await asyncio.gather(
+                    renames,
+                    self._apply_overwrite(order_channel, guild.default_role, state),
+                )
+
+            # Re-read: /setschedule may have saved while the API calls were in flight,
+            # and only the fields below belong to the transition
+            current = self.record(guild.id)
+            updated = dict(current)
+            updated.update({
+                "state": state,
+                "message": message if state == "paused" else None,
+                "status_channel_ids": [channel.id for channel in status_channels],
+                "order_channel_id": order_channel.id if order_channel else None,
+            })
+            if overwrite is not None:
+                allow, deny = overwrite.pair()
+                updated["overwrite"] = {"allow": allow.value, "deny": deny.value}
+            if updated != current:
+                updated["updated_at"] = int(time.time())
+                self._save(guild.id, updated)
+            return result
+
+    # -- timetable ---------------------------------------------------------
+
+    def _now(self) -> datetime.datetime:
+        return datetime.datetime.now(self._timezone)
+
+    def timezone_label(self) -> str:
+        return str(self._timezone) if self._timezone else "server local time"
+
+    @staticmethod
+    def _due_entry(schedule: list[dict], now: datetime.datetime) -> tuple[str, str] | None:
+        """The most recent timetable entry at or before ``now`` as ``(key, state)``."""
+        if not schedule:
+            return None
+        current = now.strftime("%H:%M")
+        passed = [entry for entry in schedule if entry["time"] <= current]
+        if passed:
+            entry, day = passed[-1], now.date()
+        else:
+            entry, day = schedule[-1], now.date() - datetime.timedelta(days=1)
+        return f"{day.isoformat()} {entry['time']}", entry["state"]
+
+    def set_schedule(self, guild_id: int, open_time: str | None, close_time: str | None) -> list[dict]:
+        schedule = []
+        if open_time:
+            schedule.append({"time": open_time, "state": "open"})
+        if close_time:
+            schedule.append({"time": close_time, "state": "closed"})
+        schedule.sort(key=lambda entry: entry["time"])
+
+        record = dict(self.record(guild_id))
+        record["schedule"] = schedule
+        # Only boundaries crossed from now on fire; don't override the current state
+        due = self._due_entry(schedule, self._now())
+        record["schedule_applied"] = due[0] if due else None
+        self._save(guild_id, record)
+        return schedule
+
+    async def run_due_schedules(self) -> None:
+        now = self._now()
+        for guild in list(bot.guilds):
+            record = self.record(guild.id)
+            due = self._due_entry(record.get("schedule") or [], now)
+            if due is None or record.get("schedule_applied") == due[0]:
+                continue
+            key, state = due
+            try:
+                result = await self.transition(guild, state)
+                log.info(f"🕒 Scheduled {state} for {guild.name}: {result.api_calls} API call(s)")
+            except Exception as exc:
+                log.warning(f"⚠️ Scheduled {state} failed for {guild.name}: {exc}")
+            record = dict(self.record(guild.id))
+            record["schedule_applied"] = key
+            self._save(guild.id, record)
+
+    def start_scheduler(self, interval: float = 30.0) -> None:
+        if self._scheduler is not None and not self._scheduler.done():
+            return
+
+        async def _loop():
+            while True:
+                try:
+                    await self.run_due_schedules()
+                except Exception as exc:
+                    log.warning(f"⚠️ Business schedule check failed: {exc}")
+                await asyncio.sleep(interval)
+
+        self._scheduler = asyncio.create_task(_loop())
+
+
+business_status = BusinessStatusEngine(storage, channel_directory, channel_renames)
+
+
+async def run_business_transition(interaction: discord.Interaction, state: str, message: str | None = None):
+    """Shared body of /open, /close and /pause."""
+    details = BUSINESS_STATES[state]
+
+    # Respond immediately to prevent timeout
+    await interaction.response.send_message(f"🔄 {details['verb']} business...", ephemeral=True)
+
+    async def report_progress(done: int, total: int):
+        await interaction.edit_original_response(content=f"🔄 {details['verb']} business... ({done}/{total} status channels)")
+
+    try:
+        result = await business_status.transition(interaction.guild, state, message, on_progress=report_progress)
+
+        if result.missing == "status":
+            if state == "paused":
+                await interaction.edit_original_response(content="❌ Could not find any status channels!")
+            else:
+                await interaction.edit_original_response(content="❌ Could not find any channels with 'open' or 'closed' in the name! Please create a status channel first.")
+            return
+        if result.missing == "order":
+            await interaction.edit_original_response(content="❌ Could not find order-here channel!")
+            return
+
+        lines = [details["headline"]]
+        if state == "paused":
+            lines.append(f"- Status: {message}")
+        lines.append(describe_rename_result(result.channel_name, result.renamed, result.unchanged, result.queued))
+        lines.append(details["order_changed"] if result.permissions_changed else details["order_unchanged"])
+        await interaction.edit_original_response(content="\n".join(lines))
+
+    except discord.Forbidden:
+        await interaction.edit_original_response(content="❌ I don't have permission to modify channels!")
+    except Exception as e:
+        await interaction.edit_original_response(content=f"❌ Error: {str(e)}")
+
+
+def _resolve_int_env(name: str, default: int, minimum: int = 1) -> int:
+    raw_value = os.getenv(name)
+    if not raw_value:
+        return default
+    try:
+        value = int(raw_value)
+        if value < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        return value
+    except (TypeError, ValueError) as exc:
+        log.warning(f"⚠️ Invalid {name} value '{raw_value}': {exc}. Falling back to {default}.")
+        return default
+
+
+class WelcomeBatcher:
+    """Collects member joins per guild and posts them in rate-aware batches.
+
+    The first join in a quiet guild starts a short collection window. When it
+    closes, a small batch is welcomed one message per member as before; once
+    the batch reaches ``threshold`` joins it is folded into combined messages
+    of at most ``max_batch`` mentions each, so a join raid costs a handful of
+    sends instead of one per member. Only one drain task runs per guild, so
+    joins arriving while a batch is being sent wait for the next window, and
+    anything past ``queue_limit`` pending joins is only counted and mentioned
+    as "+N more" rather than held in memory.
+    """
+
+    def __init__(
+        self,
+        window: float = 2.0,
+        threshold: int = 3,
+        max_batch: int = 20,
+        queue_limit: int = 500,
+    ):
+        self._window = window
+        self._threshold = max(1, threshold)
+        self._max_batch = max(1, max_batch)
+        self._queue_limit = max(self._max_batch, queue_limit)
+        self._pending: dict[int, list[discord.Member]] = {}
+        self._overflow: dict[int, int] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls) -> "WelcomeBatcher":
+        return cls(
+            window=_resolve_int_env("WELCOME_BATCH_WINDOW_MS", 2000) / 1000,
+            threshold=_resolve_int_env("WELCOME_BATCH_THRESHOLD", 3),
+            max_batch=_resolve_int_env("WELCOME_BATCH_MAX", 20),
+            queue_limit=_resolve_int_env("WELCOME_QUEUE_LIMIT", 500),
+        )
+
+    def pending(self) -> int:
+        return sum(len(members) for members in self._pending.values()) + sum(self._overflow.values())
+
+    def enqueue(self, member: discord.Member) -> None:
+        guild = member.guild
+        if member.bot or guild is None:
+            return
+        queue = self._pending.setdefault(guild.id, [])
+        if len(queue) < self._queue_limit:
+            queue.append(member)
+        else:
+            self._overflow[guild.id] = self._overflow.get(guild.id, 0) + 1
+        if guild.id not in self._workers:
+            self._workers[guild.id] = asyncio.create_task(self._drain(guild))
+
+    async def _drain(self, guild: discord.Guild) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self._window)
+                batch = self._pending.pop(guild.id, [])
+                overflow = self._overflow.pop(guild.id, 0)
+                if not batch and not overflow:
+                    # No await between the emptiness check and dropping the
+                    # worker, so a concurrent enqueue always sees either this
+                    # task or none and starts a fresh one.
+                    self._workers.pop(guild.id, None)
+                    return
+                try:
+                    await self._send_batch(guild, batch, overflow)
+                except Exception as exc:
+                    log.warning(f"⚠️ Failed to process welcome batch for guild {guild.id}: {exc}")
+        except asyncio.CancelledError:
+            self._workers.pop(guild.id, None)
+            raise
+
+    async def _send_batch(self, guild: discord.Guild, batch: list[discord.Member], overflow: int) -> None:
+        if len(batch) < self._threshold and not overflow:
+            for member in batch:
+                welcome_line = render_welcome_message(guild, member.mention)
+                if welcome_line:
+                    await self._deliver(guild, welcome_line, str(member.id))
+            return
+
+        chunks = [batch[i:i + self._max_batch] for i in range(0, len(batch), self._max_batch)] or [[]]
+        for position, chunk in enumerate(chunks):
+            mentions = ", ".join(member.mention for member in chunk)
+            if overflow and position == len(chunks) - 1:
+                extra = f"+{overflow:,} more"
+                mentions = f"{mentions} {extra}" if mentions else extra
+            welcome_line = render_welcome_message(guild, mentions)
+            if welcome_line:
+                await self._deliver(guild, welcome_line, f"{len(chunk)} members")
+
+    @staticmethod
+    async def _deliver(guild: discord.Guild, welcome_line: str, label: str) -> None:
+        fallback_channels = channel_directory.get(guild).welcome
+
+        for channel in fallback_channels:
+            try:
+                await channel.send(welcome_line)
+                return
+            except Exception as channel_exc:
+                log.warning(
+                    "⚠️ Failed to deliver welcome message for %s via %s: %s"
+                    % (label, getattr(channel, "name", "unknown"), channel_exc)
+                )
+
+        if not fallback_channels:
+            log.warning(f"⚠️ Failed to deliver welcome message for {label}: no accessible channel")
+
+
+# Defaults until bootstrap() re-reads the WELCOME_* settings
+welcome_batcher = WelcomeBatcher()
+
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    member_index.add(member)
+    welcome_batcher.enqueue(member)
+
+
+CUSTOM_COMMAND_DESCRIPTION = "Custom command"
+# Discord's slash command name rules (names are stored lowercased)
+CUSTOM_COMMAND_NAME_REGEX = re.compile(r"^[-_\w]{1,32}$")
+
+
+def _resolve_guild_id() -> int | None:
+    raw_guild_id = os.getenv('GUILD_ID')
+    if not raw_guild_id:
+        return None
+    try:
+        return int(raw_guild_id)
+    except ValueError:
+        log.warning(f"⚠️ Invalid GUILD_ID value '{raw_guild_id}'; custom commands will be registered globally.")
+        return None
+
+
+def build_custom_app_command(name: str) -> app_commands.Command:
+    """Wrap a custom command in a real slash command that answers from the dispatch table."""
+
+    async def run_custom_command(interaction: discord.Interaction) -> None:
+        response = custom_command_table.lookup(name)
+        if response is None:
+            await interaction.response.send_message(f"❌ Command `/{name}` no longer exists.", ephemeral=True)
+            return
+        await interaction.response.send_message(response)
+
+    return app_commands.Command(name=name, description=CUSTOM_COMMAND_DESCRIPTION, callback=run_custom_command)
+
+
+class CommandSyncManager:
+    """Keeps custom commands registered on the command tree and syncs only when needed.
+
+    Each scope's command payload is hashed and the hash of the last successful
+    sync is persisted in command_sync.json, so restarts and gateway reconnects
+    skip the rate-limited sync round-trip unless the schema actually changed.
+    Custom commands are registered to GUILD_ID when it is set (guild syncs are
+    instant and limited separately); built-ins stay global.
+    """
+
+    def __init__(self, tree: app_commands.CommandTree, store: DocumentStore, guild_id: int | None, delay: float = 2.0):
+        self._tree = tree
+        self._store = store
+        self._guild = discord.Object(id=guild_id) if guild_id else None
+        self._delay = delay
+        self._registered: set[str] = set()
+        # Names Discord would reject; warned about once instead of on every change
+        self._rejected: set[str] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._sync_task: asyncio.Task | None = None
+
+    def attach(self, table: CustomCommandTable) -> None:
+        """Register the table's current commands and follow its future changes."""
+        self._apply(table.names())
+        table.add_listener(self._on_table_change)
+
+    def _on_table_change(self, names: frozenset[str]) -> None:
+        if self._loop is None:
+            # Not running yet; on_ready syncs whatever is registered by then
+            self._apply(names)
+        else:
+            # Changes can arrive from the storage watcher thread; the tree is only touched on the loop
+            self._loop.call_soon_threadsafe(self._apply_and_schedule, names)
+
+    def _apply(self, names: frozenset[str]) -> bool:
+        changed = False
+        for name in self._registered - names:
+            self._tree.remove_command(name, guild=self._guild)
+            self._registered.discard(name)
+            changed = True
+        self._rejected &= names
+        for name in names - self._registered - self._rejected:
+            try:
+                self._tree.add_command(build_custom_app_command(name), guild=self._guild, override=True)
+            except (ValueError, TypeError, app_commands.AppCommandError) as exc:
+                log.warning(f"⚠️ Skipping custom command '{name}': {exc}")
+                self._rejected.add(name)
+                continue
+            self._registered.add(name)
+            changed = True
+        return changed
+
+    def _apply_and_schedule(self, names: frozenset[str]) -> None:
+        if self._apply(names):
+            self.request_sync()
+
+    def _scopes(self) -> list[discord.Object | None]:
+        return [None] if self._guild is None else [None, self._guild]
+
+    def schema_hash(self, scope: discord.Object | None) -> str:
+        payload = sorted(
+            (command.to_dict() for command in self._tree.get_commands(guild=scope)),
+            key=lambda entry: (entry.get("type", 1), entry["name"]),
+        )
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    async def sync_if_changed(self) -> None:
+        """Sync every scope whose command schema differs from the last successful sync."""
+        self._loop = asyncio.get_running_loop()
+        for scope in self._scopes():
+            key = "global" if scope is None else f"guild:{scope.id}"
+            digest = self.schema_hash(scope)
+            if self._store.get("command_sync").get(key) == digest:
+                log.info(f"Command schema unchanged ({key}); skipping sync")
+                continue
+            try:
+                synced = await self._tree.sync(guild=scope)
+            except discord.HTTPException as exc:
+                log.warning(f"Failed to sync commands ({key}): {exc}")
+                continue
+            self._store.apply("command_sync", {"op": "set", "key": key, "value": digest})
+            log.info(f"Synced {len(synced)} command(s) ({key})")
+
+    async def _delayed_sync(self) -> None:
+        # Let a flurry of create/delete calls settle into one sync
+        await asyncio.sleep(self._delay)
+        self._sync_task = None
+        await self.sync_if_changed()
+
+    def request_sync(self) -> None:
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._delayed_sync())
+
+
+class _ResponseTicket:
+    __slots__ = ("lock", "deferred_ephemeral", "answered")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.deferred_ephemeral: bool | None = None
+        self.answered = False
+
+
+class CommandExecutor:
+    """Runs slash-command bodies within Discord's 3-second acknowledgement window.
+
+    Bodies run on a bounded pool of ``workers`` concurrent slots. Before a
+    body starts, the interaction is deferred up front when the command's EWMA
+    latency exceeds ``budget`` seconds or every slot is busy; otherwise a
+    watchdog defers it if the body still hasn't answered once ``budget`` has
+    passed. Bodies answer through ``respond``/``defer`` so the watchdog and
+    the body never both acknowledge the same interaction.
+    """
+
+    def __init__(self, workers: int = 16, budget: float = 1.5, alpha: float = 0.2):
+        self._slots = asyncio.Semaphore(workers)
+        self._budget = budget
+        self._alpha = alpha
+        # Smoothed latency per command; counts and durations go to the metrics registry
+        self._ewma: dict[str, float] = {}
+        self._tickets: dict[int, _ResponseTicket] = {}
+
+    @classmethod
+    def from_env(cls) -> "CommandExecutor":
+        return cls(
+            workers=_resolve_int_env("COMMAND_WORKERS", 16),
+            budget=_resolve_int_env("RESPONSE_BUDGET_MS", 1500) / 1000,
+        )
+
+    def load_env(self) -> None:
+        """Adopt COMMAND_WORKERS / RESPONSE_BUDGET_MS in place; decorated commands hold this instance."""
+        configured = self.from_env()
+        self._slots = configured._slots
+        self._budget = configured._budget
+
+    def predicted(self, name: str) -> float:
+        return self._ewma.get(name, 0.0)
+
+    def _record(self, name: str, elapsed: float, deferred: bool) -> None:
+        ewma = self._ewma.get(name)
+        self._ewma[name] = elapsed if ewma is None else ewma + self._alpha * (elapsed - ewma)
+        if deferred:
+            metrics.inc("speedwagon_command_deferrals_total", (("command", name),))
+
+    async def _defer_locked(self, interaction: discord.Interaction, ticket: _ResponseTicket, ephemeral: bool) -> bool:
+        if interaction.response.is_done():
+            return False
+        await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        ticket.deferred_ephemeral = ephemeral
+        return True
+
+    async def defer(self, interaction: discord.Interaction, ephemeral: bool = False) -> None:
+        """Acknowledge ``interaction`` now unless it already has been."""
+        ticket = self._tickets.get(interaction.id)
+        if ticket is None:
+            if not interaction.response.is_done():
+                await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            return
+        async with ticket.lock:
+            await self._defer_locked(interaction, ticket, ephemeral)
+
+    async def respond(self, interaction: discord.Interaction, content: str | None = None, *, ephemeral: bool = False, **kwargs) -> None:
+        """Send a reply whether or not the interaction was deferred."""
+        ticket = self._tickets.get(interaction.id)
+        if ticket is None:
+            if interaction.response.is_done():
+                await interaction.followup.send(content, ephemeral=ephemeral, **kwargs)
+            else:
+                await interaction.response.send_message(content, ephemeral=ephemeral, **kwargs)
+            return
+
+        async with ticket.lock:
+            if not interaction.response.is_done():
+                await interaction.response.send_message(content, ephemeral=ephemeral, **kwargs)
+                return
+            if ticket.deferred_ephemeral is False and ephemeral and not ticket.answered:
+                # The first follow-up inherits the public "thinking…" placeholder's
+                # visibility; drop it so a private reply stays private
+                await interaction.delete_original_response()
+            ticket.answered = True
+            await interaction.followup.send(content, ephemeral=ephemeral, **kwargs)
+
+    async def _watchdog(self, interaction: discord.Interaction, ticket: _ResponseTicket, ephemeral: bool) -> None:
+        await asyncio.sleep(self._budget)
+        async with ticket.lock:
+            await self._defer_locked(interaction, ticket, ephemeral)
+
+    def run(self, ephemeral: bool = False):
+        """Decorator wrapping a slash-command callback; ``ephemeral`` applies to deferrals."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+                name = interaction.command.qualified_name if interaction.command else func.__name__
+                ticket = self._tickets[interaction.id] = _ResponseTicket()
+                started = time.perf_counter()
+                watchdog = None
+                try:
+                    if self.predicted(name) > self._budget or self._slots.locked():
+                        async with ticket.lock:
+                            await self._defer_locked(interaction, ticket, ephemeral)
+                    async with self._slots:
+                        if ticket.deferred_ephemeral is None:
+                            watchdog = asyncio.create_task(self._watchdog(interaction, ticket, ephemeral))
+                        return await func(interaction, *args, **kwargs)
+                finally:
+                    # Leave a watchdog that is mid-defer alone; it will see the
+                    # response is done (or finish acknowledging) on its own
+                    if watchdog is not None and not ticket.lock.locked():
+                        watchdog.cancel()
+                    elapsed = time.perf_counter() - started
+                    self._record(name, elapsed, ticket.deferred_ephemeral is not None)
+                    self._tickets.pop(interaction.id, None)
+                    if elapsed > 2.5:
+                        log.warning(
+                            "🐢 /%s took %.2fs (ewma %.2fs)", name, elapsed, self.predicted(name),
+                            extra={"command": name, "guild": interaction.guild_id, "user": interaction.user.id, "latency_ms": round(elapsed * 1000, 1)},
+                        )
+
+            return wrapper
+
+        return decorator
+
+
+# Commands bind this instance when decorated; bootstrap() applies the env settings
+command_executor = CommandExecutor()
+
+
+class LoopLagMonitor:
+    """Samples event-loop scheduling delay by timing a short periodic sleep.
+
+    Each sample also stamps the liveness heartbeat.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self._interval = interval
+        self.last_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.last_lag = max(0.0, loop.time() - expected)
+            runtime_health.beat()
+            metrics.observe("speedwagon_event_loop_lag_seconds", self.last_lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def _gateway_latency() -> float | None:
+    latency = bot.latency
+    # discord.py reports inf/nan until the first heartbeat is acknowledged
+    return latency if latency == latency and latency != float("inf") else None
+
+
+metrics.gauge(
+    "speedwagon_account_queue_depth",
+    "Accounts waiting in each category.",
+    # None (no samples) until bootstrap() has opened the queue
+    lambda: None if account_queue is None else [((("category", category),), count) for category, count in account_queue.counts().items()],
+)
+metrics.gauge(
+    "speedwagon_account_leases_outstanding",
+    "Accounts reserved by /getaccount and not yet confirmed.",
+    lambda: None if account_queue is None else account_queue.leased(),
+)
+metrics.gauge("speedwagon_gateway_latency_seconds", "Discord gateway heartbeat latency.", _gateway_latency)
+metrics.gauge("speedwagon_event_loop_lag_last_seconds", "Most recent event loop lag sample.", lambda: loop_lag_monitor.last_lag)
+metrics.gauge("speedwagon_welcome_queue_depth", "Member joins waiting for a welcome batch.", lambda: welcome_batcher.pending())
+
+
+@bot.event
+async def on_ready():
+    log.info(f'{bot.user} has connected to Discord!')
+    runtime_health.gateway_connected = True
+    loop_lag_monitor.start()
+    try:
+        await command_sync.sync_if_changed()
     except Exception as e:
-        print(f"Failed to sync commands: {e}")
+        log.warning(f"Failed to sync commands: {e}")
+    business_status.start_scheduler()
+    account_queue.start_reaper()
+
+
+@bot.event
+async def on_resumed():
+    runtime_health.gateway_connected = True
+
+
+@bot.event
+async def on_disconnect():
+    runtime_health.gateway_connected = False
 
 @bot.tree.command(name="createcommand", description="Create a new custom command (Provider role only)")
+@require_provider()
 @app_commands.describe(
     command_name="Name of the command (without /)",
     response="What the command should respond with"
 )
 async def createcommand(interaction: discord.Interaction, command_name: str, response: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
+    if not CUSTOM_COMMAND_NAME_REGEX.match(command_name.lower()):
+        await interaction.response.send_message("❌ Command names must be 1-32 letters, numbers, `-` or `_` (no spaces).", ephemeral=True)
         return
 
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
+    if custom_command_table.is_builtin(command_name.lower()):
+        await interaction.response.send_message(f"❌ `/{command_name}` is a built-in command and can't be overridden.", ephemeral=True)
         return
-    
-    # Load existing commands
-    custom_commands = load_custom_commands()
-    
+
     # Check if command already exists
-    if command_name.lower() in custom_commands:
+    if command_name.lower() in custom_command_table:
         await interaction.response.send_message(f"❌ Command `/{command_name}` already exists! Use `/editcommand` to modify it.", ephemeral=True)
         return
     
     # Add new command
-    custom_commands[command_name.lower()] = response
-    save_custom_commands(custom_commands)
+    storage.apply("custom_commands", {"op": "set", "key": command_name.lower(), "value": response})
     
     await interaction.response.send_message(f"✅ New command `/{command_name}` has been created!", ephemeral=True)
 
 @bot.tree.command(name="editcommand", description="Edit an existing custom command (Provider role only)")
+@require_provider()
 @app_commands.describe(
     command_name="Name of the command to edit",
     response="New response for the command"
 )
 async def editcommand(interaction: discord.Interaction, command_name: str, response: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
-    # Load existing commands
-    custom_commands = load_custom_commands()
-    
     # Check if command exists
-    if command_name.lower() not in custom_commands:
+    if command_name.lower() not in custom_command_table:
         await interaction.response.send_message(f"❌ Command `/{command_name}` doesn't exist! Use `/createcommand` to create it.", ephemeral=True)
         return
     
     # Update command
-    custom_commands[command_name.lower()] = response
-    save_custom_commands(custom_commands)
+    storage.apply("custom_commands", {"op": "set", "key": command_name.lower(), "value": response})
     
     await interaction.response.send_message(f"✅ Command `/{command_name}` has been updated!", ephemeral=True)
 
 
 @bot.tree.command(name="bulkadd", description="Bulk add accounts to a category (Provider role only)")
+@require_provider()
 @app_commands.describe(
     category="Name of the account category",
-    entries="Text containing accounts (one per line)"
+    entries="Text containing accounts (one per line)",
+    file="A .txt or .csv file with one account per line (for large imports)"
 )
-async def bulkadd(interaction: discord.Interaction, category: str, entries: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
+@command_executor.run(ephemeral=True)
+async def bulkadd(
+    interaction: discord.Interaction,
+    category: str,
+    entries: str | None = None,
+    file: discord.Attachment | None = None,
+):
+    if not entries and file is None:
+        await command_executor.respond(interaction, "⚠️ Paste account lines in `entries` or attach a .txt/.csv file.", ephemeral=True)
         return
 
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
+    if file is not None and not file.filename.lower().endswith(BULKADD_EXTENSIONS):
+        await command_executor.respond(interaction, "⚠️ Attachments must be a `.txt` or `.csv` file.", ephemeral=True)
         return
 
-    parsed_accounts = parse_accounts_from_text(entries)
-    if not parsed_accounts:
-        await interaction.response.send_message("⚠️ I couldn't find any account lines containing an email address.", ephemeral=True)
-        return
+    # Large imports can take a while; acknowledge now and report back when done
+    await command_executor.defer(interaction, ephemeral=True)
 
-    accounts_store = load_accounts()
     category_key = category.strip().lower()
-    stored_accounts = accounts_store.setdefault(category_key, [])
-
-    existing = set(stored_accounts)
+    parsed_count = 0
     added = 0
-    for account in parsed_accounts:
-        if account not in existing:
-            stored_accounts.append(account)
-            existing.add(account)
-            added += 1
 
-    save_accounts(accounts_store)
+    if entries:
+        parsed_accounts = parse_accounts_from_text(entries)
+        if parsed_accounts:
+            parsed_count += len(parsed_accounts)
+            added += await account_queue.push(category_key, parsed_accounts)
+
+    if file is not None:
+        last_update = time.monotonic()
+
+        async def report_progress(parsed: int, new: int) -> None:
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update < 2:
+                return
+            last_update = now
+            await interaction.edit_original_response(
+                content=f"⏳ Importing `{file.filename}`… {parsed_count + parsed:,} line(s) parsed, {added + new:,} new so far."
+            )
+
+        try:
+            file_parsed, file_added = await ingest_account_attachment(file, category_key, report_progress)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            await interaction.edit_original_response(content=f"❌ Could not download `{file.filename}`: {exc}")
+            return
+        parsed_count += file_parsed
+        added += file_added
 
-    duplicates = len(parsed_accounts) - added
+    if not parsed_count:
+        await interaction.edit_original_response(content="⚠️ I couldn't find any account lines containing an email address.")
+        return
+
+    duplicates = parsed_count - added
     response_lines = [f"✅ Added {added} new account(s) to `{category}`."]
-    response_lines.append(f"📦 `{category}` now has {len(stored_accounts)} account(s) available.")
+    response_lines.append(f"📦 `{category}` now has {account_queue.count(category_key)} account(s) available.")
     if duplicates > 0:
-        response_lines.append(f"ℹ️ Skipped {duplicates} duplicate line(s).")
+        response_lines.append(f"ℹ️ Skipped {duplicates} duplicate line(s) (queued now or pulled before).")
+    response_lines.append(f"🔎 Dedup index hit rate: {duplicates / parsed_count:.0%} ({duplicates}/{parsed_count}).")
 
-    await interaction.response.send_message("\n".join(response_lines), ephemeral=True)
+    await interaction.edit_original_response(content="\n".join(response_lines))
 
 
 @bot.tree.command(name="getaccount", description="Retrieve and remove the next account from a category")
+@require_provider()
 @app_commands.describe(category="Name of the account category to pull from")
+@command_executor.run(ephemeral=True)
 async def getaccount(interaction: discord.Interaction, category: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-
-    accounts_store = load_accounts()
     category_key = category.strip().lower()
-    queued_accounts = accounts_store.get(category_key, [])
+    lease = await account_queue.reserve(category_key, interaction.user.id)
 
-    if not queued_accounts:
-        await interaction.response.send_message(f"⚠️ No accounts stored for `{category}`.", ephemeral=True)
+    if lease is None:
+        await command_executor.respond(interaction, f"⚠️ No accounts stored for `{category}`.", ephemeral=True)
         return
 
-    account_line = normalize_account_line(queued_accounts.pop(0))
-    if not queued_accounts:
-        accounts_store.pop(category_key, None)
-    save_accounts(accounts_store)
+    try:
+        await command_executor.respond(
+            interaction,
+            lease.line,
+            ephemeral=True,
+            allowed_mentions=AllowedMentions.none()
+        )
+    except BaseException:
+        # Never reached the provider; the next pull gets it instead
+        await account_queue.release(lease)
+        raise
 
-    await interaction.response.send_message(
-        account_line,
-        ephemeral=True,
-        allowed_mentions=AllowedMentions.none()
-    )
+    if not await account_queue.confirm(lease):
+        log.warning(f"⚠️ Lease on a `{category_key}` account expired before delivery was confirmed; it may have been pulled twice")
 
-    await interaction.followup.send(
-        f"✅ Removed the retrieved `{category}` entry from the queue. {len(queued_accounts)} account(s) remain.",
+    await command_executor.respond(
+        interaction,
+        f"✅ Removed the retrieved `{category}` entry from the queue. {lease.remaining} account(s) remain.",
         ephemeral=True
     )
 
 
 @bot.tree.command(name="listaccounts", description="List stored account categories and counts (Provider role only)")
+@require_provider()
+@command_executor.run(ephemeral=True)
 async def listaccounts(interaction: discord.Interaction):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-
-    accounts_store = load_accounts()
-    if not accounts_store:
-        await interaction.response.send_message("📭 No accounts have been stored yet.", ephemeral=True)
+    category_counts = account_queue.counts()
+    if not category_counts:
+        await command_executor.respond(interaction, "📭 No accounts have been stored yet.", ephemeral=True)
         return
 
     embed = discord.Embed(
@@ -734,34 +3510,24 @@ async def listaccounts(interaction: discord.Interaction):
         color=0x3498db
     )
 
-    for category_key, items in sorted(accounts_store.items()):
+    for category_key, remaining in sorted(category_counts.items()):
         display_name = category_key
-        embed.add_field(name=display_name, value=f"{len(items)} account(s)", inline=False)
+        embed.add_field(name=display_name, value=f"{remaining} account(s)", inline=False)
 
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await command_executor.respond(interaction, embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="clearaccount", description="Remove all accounts from a category (Provider role only)")
+@require_provider()
 @app_commands.describe(category="Name of the account category to clear")
 async def clearaccount(interaction: discord.Interaction, category: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-
-    accounts_store = load_accounts()
     category_key = category.strip().lower()
 
-    if category_key not in accounts_store:
+    if not account_queue.count(category_key):
         await interaction.response.send_message(f"⚠️ `{category}` doesn't have any stored accounts.", ephemeral=True)
         return
 
-    removed = len(accounts_store.pop(category_key, []))
-    save_accounts(accounts_store)
+    removed = await account_queue.clear(category_key)
 
     await interaction.response.send_message(
         f"🗑️ Cleared `{removed}` account(s) from `{category}`.",
@@ -769,190 +3535,33 @@ async def clearaccount(interaction: discord.Interaction, category: str):
     )
 
 
-@bot.tree.command(name="neck", description="Get payment method links")
-async def neck(interaction: discord.Interaction):
-    # LAYER 4 DEFENSE: Individual command guard
-    if is_user_barred(interaction.user.id):
-        return
-    
-    # Load payment links
-    all_links = load_payment_links()
-    links = all_links.get("neck", {})
-    
-    embed = discord.Embed(
-        title="💳 Payment Methods - Neck",
-        description="Here are our accepted payment methods:",
-        color=0x0099ff
-    )
-    
-    # Add fields only if links are set
-    if links.get("apple_pay"):
-        embed.add_field(
-            name="🍎 Apple Pay",
-            value=links['apple_pay'],
-            inline=False
-        )
-    
-    if links.get("zelle"):
-        embed.add_field(
-            name="💸 Zelle",
-            value=f"[Send to Zelle]({links['zelle']})",
-            inline=False
-        )
-    
-    if links.get("cashapp"):
-        embed.add_field(
-            name="📱 Cash App (Add 25¢ for fees)",
-            value=f"[Send via Cash App]({links['cashapp']})",
-            inline=False
-        )
-    
-    if links.get("credit"):
-        embed.add_field(
-            name="💳 Credit/Debit",
-            value=f"[Pay Online]({links['credit']})",
-            inline=False
-        )
-    
-    # If no links are set, show a message
-    if not any(links.values()):
-        embed.add_field(
-            name="⚠️ No Payment Links Set",
-            value="Contact an admin to set up payment methods using `/setlink`",
-            inline=False
-        )
-    
-    embed.set_footer(text="Contact support if you need help with payment!")
-    
-    await interaction.response.send_message(embed=embed)
+def build_payment_command(provider: str) -> app_commands.Command:
+    async def payment_links_command(interaction: discord.Interaction):
+        await interaction.response.send_message(embed=payment_embeds.get(provider))
 
-@bot.tree.command(name="eli", description="Get payment method links")
-async def eli(interaction: discord.Interaction):
-    # LAYER 4 DEFENSE: Individual command guard
-    if is_user_barred(interaction.user.id):
-        return
-    
-    # Load payment links
-    all_links = load_payment_links()
-    links = all_links.get("eli", {})
-    
-    embed = discord.Embed(
-        title="💳 Payment Methods - Eli",
-        description="Here are our accepted payment methods:",
-        color=0x0099ff
+    return app_commands.Command(
+        name=provider,
+        description="Get payment method links",
+        callback=payment_links_command,
     )
-    
-    # Add fields only if links are set
-    if links.get("apple_pay"):
-        embed.add_field(
-            name="🍎 Apple Pay",
-            value=links['apple_pay'],
-            inline=False
-        )
-    
-    if links.get("zelle"):
-        embed.add_field(
-            name="💸 Zelle",
-            value=f"[Send to Zelle]({links['zelle']})",
-            inline=False
-        )
-    
-    if links.get("cashapp"):
-        embed.add_field(
-            name="📱 Cash App (Add 25¢ for fees)",
-            value=f"[Send via Cash App]({links['cashapp']})",
-            inline=False
-        )
-    
-    if links.get("credit"):
-        embed.add_field(
-            name="💳 Credit/Debit",
-            value=f"[Pay Online]({links['credit']})",
-            inline=False
-        )
-    
-    # If no links are set, show a message
-    if not any(links.values()):
-        embed.add_field(
-            name="⚠️ No Payment Links Set",
-            value="Contact an admin to set up payment methods using `/setlink`",
-            inline=False
-        )
-    
-    embed.set_footer(text="Contact support if you need help with payment!")
-    
-    await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="angie", description="Get payment method links")
-async def angie(interaction: discord.Interaction):
-    # LAYER 4 DEFENSE: Individual command guard
-    if is_user_barred(interaction.user.id):
-        return
-    
-    # Load payment links
-    all_links = load_payment_links()
-    links = all_links.get("angie", {})
-    
-    embed = discord.Embed(
-        title="💳 Payment Methods - Angie",
-        description="Here are our accepted payment methods:",
-        color=0x0099ff
-    )
-    
-    # Add fields only if links are set
-    if links.get("apple_pay"):
-        embed.add_field(
-            name="🍎 Apple Pay",
-            value=links['apple_pay'],
-            inline=False
-        )
-    
-    if links.get("zelle"):
-        embed.add_field(
-            name="💸 Zelle",
-            value=f"[Send to Zelle]({links['zelle']})",
-            inline=False
-        )
-    
-    if links.get("cashapp"):
-        embed.add_field(
-            name="📱 Cash App (Add 25¢ for fees)",
-            value=f"[Send via Cash App]({links['cashapp']})",
-            inline=False
-        )
-    
-    if links.get("credit"):
-        embed.add_field(
-            name="💳 Credit/Debit",
-            value=f"[Pay Online]({links['credit']})",
-            inline=False
-        )
-    
-    # If no links are set, show a message
-    if not any(links.values()):
-        embed.add_field(
-            name="⚠️ No Payment Links Set",
-            value="Contact an admin to set up payment methods using `/setlink`",
-            inline=False
-        )
-    
-    embed.set_footer(text="Contact support if you need help with payment!")
-    
-    await interaction.response.send_message(embed=embed)
+
+for _provider in dict(PAYMENT_PROVIDERS):
+    bot.tree.add_command(build_payment_command(_provider))
+
 
 @bot.tree.command(name="enjoy", description="Send a personalized thank-you message to a customer")
 @app_commands.describe(
     customer="The customer to thank (type their name or mention them with @)"
 )
+@command_executor.run(ephemeral=False)
 async def enjoy(interaction: discord.Interaction, customer: str):
-    # LAYER 4 DEFENSE: Individual command guard
-    if is_user_barred(interaction.user.id):
-        return
-
     guild = interaction.guild
     if guild is None:
-        await interaction.response.send_message(
-            "❌ This command can only be used inside a server.", ephemeral=True
+        await command_executor.respond(
+            interaction,
+            "❌ This command can only be used inside a server.",
+            ephemeral=True
         )
         return
 
@@ -970,87 +3579,56 @@ async def enjoy(interaction: discord.Interaction, customer: str):
                 pass
         else:
             # Look up by display name or username
-            for member in guild.members:
-                if member.display_name.lower() == customer.lower() or member.name.lower() == customer.lower():
-                    target_user = member
-                    break
+            target_user = member_index.resolve(guild, customer)
 
         if not target_user:
-            await interaction.response.send_message(f"❌ Could not find user '{customer}'. Please type their exact name or mention them with @", ephemeral=True)
+            await command_executor.respond(interaction, f"❌ Could not find user '{customer}'. Please type their exact name or mention them with @", ephemeral=True)
             return
 
-        # Load messages and pick current one
-        enjoy_data = load_enjoy_messages()
-        messages = enjoy_data.get("messages", [])
-        index = enjoy_data.get("index", 0)
+        # Claim the next rotation slot before any await so concurrent calls get distinct messages
+        templates = enjoy_templates.templates()
+        index = rotation_counters.next("enjoy")
 
-        print(f"DEBUG: Loaded {len(messages)} messages, current index: {index}")  # Debug log
-
-        if not messages:
-            await interaction.response.send_message("⚠️ No enjoy messages configured.")
+        if not templates:
+            await command_executor.respond(interaction, "⚠️ No enjoy messages configured.")
             return
 
-        # Get the raw message template
-        message_template = messages[index % len(messages)]
-        print(f"DEBUG: Raw message template: {message_template}")  # Debug log
+        # Get the precompiled message template
+        message_template = templates[index % len(templates)]
 
-        # Replace (user) placeholder with the customer's mention (creates @ping)
-        personalized_message = message_template.replace("(user)", target_user.mention)
-
-        # Convert #vouch and #casino placeholders into channel mentions
-        vouch_channel = None
-        casino_channel = None
-        try:
-            # Prefer exact channel name 'vouch-📸', then any channel containing 'vouch'
-            vouch_channel = next(
-                (c for c in guild.text_channels if c.name == 'vouch-📸'),
-                None
-            )
-            if vouch_channel is None:
-                vouch_channel = next(
-                    (c for c in guild.text_channels if 'vouch' in c.name.lower()),
-                    None
-                )
-            # Exact name first, then any channel containing 'casino' (ignoring suits)
-            casino_channel = next(
-                (c for c in guild.text_channels if c.name == '♠♥casino♣♦'),
-                None
-            )
-            if casino_channel is None:
-                casino_channel = next(
-                    (c for c in guild.text_channels if 'casino' in c.name.lower()),
-                    None
-                )
-        except Exception:
-            pass
-
-        if vouch_channel is not None:
-            personalized_message = personalized_message.replace('#vouch', f'<#{vouch_channel.id}>')
-            personalized_message = personalized_message.replace('#vouch-📸', f'<#{vouch_channel.id}>')
-
-        if casino_channel is not None:
-            personalized_message = personalized_message.replace('#casino', f'<#{casino_channel.id}>')
-            personalized_message = personalized_message.replace('#♠♥casino♣♦', f'<#{casino_channel.id}>')
-
-        print(f"DEBUG: Personalized message: {personalized_message}")  # Debug log
+        # (user) becomes the customer's mention (creates @ping); #vouch and #casino
+        # become channel mentions when those channels exist
+        channel_targets = channel_directory.get(guild)
+        vouch_channel = channel_targets.vouch
+        casino_channel = channel_targets.casino
+        personalized_message = message_template.render({
+            "user": target_user.mention,
+            "vouch": f'<#{vouch_channel.id}>' if vouch_channel is not None else None,
+            "casino": f'<#{casino_channel.id}>' if casino_channel is not None else None,
+        })
 
         # Send the personalized message
-        await interaction.response.send_message(personalized_message)
+        await command_executor.respond(interaction, personalized_message)
 
-        # Advance the index and save
-        enjoy_data["index"] = (index + 1) % len(messages)
-        save_enjoy_messages(enjoy_data)
-        print(f"DEBUG: Advanced index to: {enjoy_data['index']}")  # Debug log
+        log.debug(
+            "enjoy sent template %d/%d (%d chars)", index % len(templates), len(templates), len(personalized_message),
+            extra={"command": "enjoy", "guild": guild.id, "user": interaction.user.id},
+        )
     except Exception as e:
-        print(f"ERROR in enjoy command: {e}")  # Debug log
-        await interaction.response.send_message(f"❌ Error: {str(e)}", ephemeral=True)
+        log.exception("enjoy command failed: %s", e, extra={"command": "enjoy", "guild": guild.id, "user": interaction.user.id})
+        await command_executor.respond(interaction, f"❌ Error: {str(e)}", ephemeral=True)
+
+@enjoy.autocomplete("customer")
+async def enjoy_customer_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    if interaction.guild is None or not current:
+        return []
+    return [
+        app_commands.Choice(name=f"{member.display_name} (@{member.name})"[:100], value=member.mention)
+        for member in member_index.complete(interaction.guild, current)
+    ]
 
 @bot.tree.command(name="listcommands", description="List all custom commands")
 async def listcommands(interaction: discord.Interaction):
-    # LAYER 4 DEFENSE: Individual command guard
-    if is_user_barred(interaction.user.id):
-        return
-    
     custom_commands = load_custom_commands()
     
     if not custom_commands:
@@ -1071,101 +3649,48 @@ async def listcommands(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="deletecommand", description="Delete a custom command (Provider role only)")
+@require_provider()
 @app_commands.describe(
     command_name="Name of the command to delete"
 )
 async def deletecommand(interaction: discord.Interaction, command_name: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
-    custom_commands = load_custom_commands()
-    
-    if command_name.lower() not in custom_commands:
+    if command_name.lower() not in custom_command_table:
         await interaction.response.send_message(f"❌ Command `/{command_name}` doesn't exist!", ephemeral=True)
         return
     
     # Delete the command
-    del custom_commands[command_name.lower()]
-    save_custom_commands(custom_commands)
+    storage.apply("custom_commands", {"op": "delete", "key": command_name.lower()})
     
     await interaction.response.send_message(f"🗑️ Command `/{command_name}` has been deleted!", ephemeral=True)
 
 @bot.tree.command(name="setlink", description="Set a payment method link (Provider role only)")
+@require_provider()
 @app_commands.describe(
-    provider="Which provider to set links for (neck, eli, angie)",
+    provider="Which provider to set links for",
     payment_method="Which payment method to set (apple_pay, zelle, cashapp, credit)",
     url="The URL/link for this payment method"
 )
 @app_commands.choices(provider=[
-    app_commands.Choice(name="Neck", value="neck"),
-    app_commands.Choice(name="Eli", value="eli"),
-    app_commands.Choice(name="Angie", value="angie")
+    app_commands.Choice(name=display_name, value=provider) for provider, display_name in PAYMENT_PROVIDERS
 ])
 @app_commands.choices(payment_method=[
-    app_commands.Choice(name="Apple Pay", value="apple_pay"),
-    app_commands.Choice(name="Zelle", value="zelle"),
-    app_commands.Choice(name="Cash App", value="cashapp"),
-    app_commands.Choice(name="Credit/Debit", value="credit")
+    app_commands.Choice(name=choice_name, value=method) for method, choice_name, *_ in PAYMENT_METHODS
 ])
 async def setlink(interaction: discord.Interaction, provider: str, payment_method: str, url: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
-    # Load existing links
-    all_links = load_payment_links()
-    
-    # Make sure the provider exists in the links
-    if provider not in all_links:
-        all_links[provider] = {
-            "apple_pay": "",
-            "zelle": "",
-            "cashapp": "",
-            "credit": ""
-        }
-    
     # For Apple Pay, convert phone number to clickable link
+    value = url
     if payment_method == "apple_pay":
         # Check if it's just a phone number (digits only, possibly with + at start)
-        if url.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "").isdigit():
+        clean_number = url.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
+        if clean_number.isdigit():
             # Format phone number and create clickable link for iMessage
-            clean_number = url.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
-            clickable_link = f"[Message {url}](sms:{clean_number})"
-            all_links[provider][payment_method] = clickable_link
-        else:
-            # If it's already a full URL, use it as is
-            all_links[provider][payment_method] = url
-    else:
-        # For other payment methods, use the URL as provided
-        all_links[provider][payment_method] = url
-    
-    save_payment_links(all_links)
+            value = f"[Message {url}](sms:{clean_number})"
+
+    set_payment_link(provider, payment_method, value)
     
     # Get display names
-    provider_names = {
-        "neck": "Neck",
-        "eli": "Eli",
-        "angie": "Angie"
-    }
-    method_names = {
-        "apple_pay": "Apple Pay",
-        "zelle": "Zelle", 
-        "cashapp": "Cash App",
-        "credit": "Credit/Debit"
-    }
+    provider_names = dict(PAYMENT_PROVIDERS)
+    method_names = {method: choice_name for method, choice_name, *_ in PAYMENT_METHODS}
     
     await interaction.response.send_message(
         f"✅ {method_names[payment_method]} link has been set for {provider_names[provider]}!\n`{url}`", 
@@ -1173,17 +3698,8 @@ async def setlink(interaction: discord.Interaction, provider: str, payment_metho
     )
 
 @bot.tree.command(name="viewlinks", description="View all current payment links (Provider role only)")
+@require_provider()
 async def viewlinks(interaction: discord.Interaction):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
     # Load payment links
     all_links = load_payment_links()
     
@@ -1193,19 +3709,9 @@ async def viewlinks(interaction: discord.Interaction):
         color=0x00ff00
     )
     
-    provider_names = {
-        "neck": "Neck",
-        "eli": "Eli",
-        "angie": "Angie"
-    }
-    method_names = {
-        "apple_pay": "🍎 Apple Pay",
-        "zelle": "💸 Zelle",
-        "cashapp": "📱 Cash App", 
-        "credit": "💳 Credit/Debit"
-    }
+    method_names = {method: label for method, _, label, *_ in PAYMENT_METHODS}
     
-    for provider, provider_display in provider_names.items():
+    for provider, provider_display in PAYMENT_PROVIDERS:
         provider_links = all_links.get(provider, {})
         if any(provider_links.values()):
             embed.add_field(
@@ -1229,215 +3735,306 @@ async def viewlinks(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="open", description="Open the business - rename status channel and make order channel public (Provider role only)")
+@require_provider()
 async def open_business(interaction: discord.Interaction):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
-    # Respond immediately to prevent timeout
-    await interaction.response.send_message("🔄 Opening business...", ephemeral=True)
-    
-    try:
-        # Find ALL channels with "open", "closed", "pause" or status emoji in the name and rename them
-        renamed_channels = []
-        for channel in interaction.guild.channels:
-            if "open" in channel.name.lower() or "closed" in channel.name.lower() or "pause" in channel.name.lower() or "🟢" in channel.name or "🔴" in channel.name or "🟡" in channel.name:
-                await channel.edit(name="🟢-open")
-                renamed_channels.append(channel.name)
-        
-        if not renamed_channels:
-            await interaction.edit_original_response(content="❌ Could not find any channels with 'open' or 'closed' in the name! Please create a status channel first.")
-            return
-        
-        # Find the order-here channel specifically
-        order_channel = None
-        for channel in interaction.guild.channels:
-            if "order-here" in channel.name.lower():
-                order_channel = channel
-                break
-        
-        if not order_channel:
-            await interaction.edit_original_response(content="❌ Could not find order-here channel!")
-            return
-        
-        # Make order-here channel public (remove @everyone overwrite if it exists)
-        everyone_role = interaction.guild.default_role
-        overwrites = order_channel.overwrites_for(everyone_role)
-        
-        # Set permissions for @everyone: can view and react, but cannot send messages
-        overwrites.view_channel = True
-        overwrites.send_messages = False
-        overwrites.add_reactions = True
-        await order_channel.set_permissions(everyone_role, overwrite=overwrites)
-        
-        await interaction.edit_original_response(content="✅ Business is now **OPEN**! 🟢\n- All status channels renamed to 🟢-open\n- Order-here channel is now read-only (view + react, no sending)")
-        
-    except discord.Forbidden:
-        await interaction.edit_original_response(content="❌ I don't have permission to modify channels!")
-    except Exception as e:
-        await interaction.edit_original_response(content=f"❌ Error: {str(e)}")
+    await run_business_transition(interaction, "open")
 
 @bot.tree.command(name="close", description="Close the business - rename status channel and make order channel private (Provider role only)")
+@require_provider()
 async def close_business(interaction: discord.Interaction):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
-        return
-
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
-        return
-    
-    # Respond immediately to prevent timeout
-    await interaction.response.send_message("🔄 Closing business...", ephemeral=True)
-    
-    try:
-        # Find ALL channels with "open", "closed", "pause" or status emoji in the name and rename them
-        renamed_channels = []
-        for channel in interaction.guild.channels:
-            if "open" in channel.name.lower() or "closed" in channel.name.lower() or "pause" in channel.name.lower() or "🟢" in channel.name or "🔴" in channel.name or "🟡" in channel.name:
-                await channel.edit(name="🔴-closed")
-                renamed_channels.append(channel.name)
-        
-        if not renamed_channels:
-            await interaction.edit_original_response(content="❌ Could not find any channels with 'open' or 'closed' in the name! Please create a status channel first.")
-            return
-        
-        # Find the order-here channel specifically
-        order_channel = None
-        for channel in interaction.guild.channels:
-            if "order-here" in channel.name.lower():
-                order_channel = channel
-                break
-        
-        if not order_channel:
-            await interaction.edit_original_response(content="❌ Could not find order-here channel!")
-            return
-        
-        # Make order-here channel private (deny @everyone view, send, and history)
-        everyone_role = interaction.guild.default_role
-        await order_channel.set_permissions(
-            everyone_role, 
-            view_channel=False,
-            send_messages=False,
-            read_message_history=False
-        )
-        
-        await interaction.edit_original_response(content="✅ Business is now **CLOSED**! 🔴\n- All status channels renamed to 🔴-closed\n- Order-here channel is now private (no view, send, or history)")
-        
-    except discord.Forbidden:
-        await interaction.edit_original_response(content="❌ I don't have permission to modify channels!")
-    except Exception as e:
-        await interaction.edit_original_response(content=f"❌ Error: {str(e)}")
+    await run_business_transition(interaction, "closed")
 
 @bot.tree.command(name="pause", description="Pause the business with a custom message (Provider role only)")
+@require_provider()
 @app_commands.describe(
     message="Custom message to display (e.g., 'will be open in 10')"
 )
 async def pause_business(interaction: discord.Interaction, message: str):
-    if is_user_barred(interaction.user.id):
-        await interaction.response.send_message("❌ You are barred from using this command!", ephemeral=True)
+    await run_business_transition(interaction, "paused", message)
+
+@bot.tree.command(name="setschedule", description="Set daily automatic open/close times, or leave both empty to clear (Provider role only)")
+@require_provider()
+@app_commands.describe(
+    open_time="Time to open each day, 24h HH:MM (e.g., 09:00)",
+    close_time="Time to close each day, 24h HH:MM (e.g., 22:30)"
+)
+async def set_business_schedule(interaction: discord.Interaction, open_time: str | None = None, close_time: str | None = None):
+    normalized = []
+    for value in (open_time, close_time):
+        if not value:
+            normalized.append(None)
+            continue
+        match = SCHEDULE_TIME_REGEX.match(value.strip())
+        if not match:
+            await interaction.response.send_message(f"❌ `{value}` isn't a valid time. Use 24h HH:MM, e.g. `09:00`.", ephemeral=True)
+            return
+        normalized.append(f"{int(match.group(1)):02d}:{match.group(2)}")
+
+    if normalized[0] and normalized[0] == normalized[1]:
+        await interaction.response.send_message("❌ Open and close times must differ.", ephemeral=True)
         return
 
-    # Check if user has Provider role
-    provider_role = discord.utils.get(interaction.guild.roles, name="Provider")
-    if not provider_role or provider_role not in interaction.user.roles:
-        await interaction.response.send_message("❌ You need the Provider role to use this command!", ephemeral=True)
+    schedule = business_status.set_schedule(interaction.guild.id, *normalized)
+    if not schedule:
+        await interaction.response.send_message("✅ Automatic open/close schedule cleared.", ephemeral=True)
         return
-    
-    # Respond immediately to prevent timeout
-    await interaction.response.send_message("🔄 Pausing business...", ephemeral=True)
-    
-    try:
-        # Find ALL channels with "open", "closed", "pause" or status emoji in the name
-        renamed_channels = []
-        for channel in interaction.guild.channels:
-            if "open" in channel.name.lower() or "closed" in channel.name.lower() or "pause" in channel.name.lower() or "🟢" in channel.name or "🔴" in channel.name or "🟡" in channel.name:
-                # Format: 🟡-{message} with spaces replaced by hyphens (message first for visibility)
-                safe_message = message.replace(" ", "-")
-                await channel.edit(name=f"🟡-{safe_message}")
-                renamed_channels.append(channel.name)
-        
-        if not renamed_channels:
-            await interaction.edit_original_response(content="❌ Could not find any status channels!")
+
+    lines = [f"- {entry['time']} → {entry['state']}" for entry in schedule]
+    await interaction.response.send_message(
+        f"✅ Schedule saved ({business_status.timezone_label()}):\n" + "\n".join(lines),
+        ephemeral=True
+    )
+
+command_sync: CommandSyncManager | None = None
+
+
+class GatewayLease:
+    """Lease-based leader election over the shared database.
+
+    A single ``leader_lease`` row names the instance allowed to connect to the
+    Discord gateway, and with it answer interactions and run the schedulers,
+    lease reaper and command sync, until ``expires_at``. The leader renews
+    every third of the TTL; a standby polls and takes the row once it has
+    expired, or right away when the leader releases it on shutdown.
+    """
+
+    def __init__(self, path: str, holder: str, ttl: float = 10.0, poll_interval: float = 1.0):
+        self._path = path
+        self.holder = holder
+        self._ttl = ttl
+        self._poll_interval = poll_interval
+        self._conn: sqlite3.Connection | None = None
+        # The connection lives on this thread; lock waits never block the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gateway-lease")
+        self.is_leader = False
+        self._expires_at = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self._path, isolation_level=None, timeout=self._ttl / 3)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leader_lease ("
+                "role TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _try_acquire(self, now: float) -> str:
+        """Take or renew the lease if it is ours or expired; returns whoever holds it afterwards."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT holder, expires_at FROM leader_lease WHERE role = 'gateway'").fetchone()
+            if row is not None and row[0] != self.holder and row[1] > now:
+                conn.execute("COMMIT")
+                return row[0]
+            conn.execute(
+                "INSERT INTO leader_lease (role, holder, expires_at) VALUES ('gateway', ?, ?) "
+                "ON CONFLICT(role) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                (self.holder, now + self._ttl),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.holder
+
+    def _release(self) -> None:
+        self._connection().execute("DELETE FROM leader_lease WHERE role = 'gateway' AND holder = ?", (self.holder,))
+
+    async def _attempt(self) -> str | None:
+        now = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            holder = await loop.run_in_executor(self._executor, self._try_acquire, now)
+        except sqlite3.Error as exc:
+            log.warning(f"⚠️ Gateway lease check failed: {exc}")
+            return None
+        if holder == self.holder:
+            self._expires_at = now + self._ttl
+        return holder
+
+    async def acquire(self) -> None:
+        """Wait (as a standby) until this instance holds the lease."""
+        announced = None
+        while True:
+            holder = await self._attempt()
+            if holder == self.holder:
+                self.is_leader = True
+                return
+            if holder is not None and holder != announced:
+                log.info(f"⏸️ Standing by; gateway lease held by {holder}")
+                announced = holder
+            await asyncio.sleep(self._poll_interval)
+
+    async def hold(self) -> None:
+        """Keep renewing; returns once the lease is lost or can't be renewed before it expires."""
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            holder = await self._attempt()
+            if holder == self.holder or (holder is None and time.time() < self._expires_at):
+                continue
+            self.is_leader = False
+            log.error(f"❌ Lost the gateway lease{f' to {holder}' if holder else ''}")
             return
-        
-        # Find the order-here channel and set same permissions as /close
-        order_channel = None
-        for channel in interaction.guild.channels:
-            if "order-here" in channel.name.lower():
-                order_channel = channel
-                break
-        
-        if not order_channel:
-            await interaction.edit_original_response(content="❌ Could not find order-here channel!")
+
+    async def release(self) -> None:
+        if not self.is_leader:
             return
-        
-        # Make order-here channel private (same as /close)
-        everyone_role = interaction.guild.default_role
-        await order_channel.set_permissions(
-            everyone_role, 
-            view_channel=False,
-            send_messages=False,
-            read_message_history=False
-        )
-        
-        await interaction.edit_original_response(
-            content=f"✅ Business is now **PAUSED**! 🟡\n- Status: {message}\n- All status channels updated\n- Order-here channel is now private"
-        )
-        
-    except discord.Forbidden:
-        await interaction.edit_original_response(content="❌ I don't have permission to modify channels!")
-    except Exception as e:
-        await interaction.edit_original_response(content=f"❌ Error: {str(e)}")
+        self.is_leader = False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._release)
+        except sqlite3.Error as exc:
+            log.warning(f"⚠️ Failed to release the gateway lease; a standby takes over once it expires: {exc}")
 
-# Dynamic command handler for custom commands
-@bot.event
-async def on_interaction(interaction: discord.Interaction):
-    """Handle incoming interactions and fall back to the default command tree."""
 
-    # LAYER 2 DEFENSE: Immediately ignore ALL interactions from barred users.
-    # This is checked before any other processing as a safety net.
-    try:
-        if interaction.user and is_user_barred(interaction.user.id):
-            command_info = getattr(interaction, "data", {}) or {}
-            command_name = command_info.get('name', 'unknown')
-            print(
-                f"🚫 [Layer 2] Silently ignoring interaction '{command_name}' from barred user {interaction.user.id}"
-            )
-            return  # Exit immediately without acknowledging
-    except Exception as e:
-        print(f"⚠️ Error checking barred status in on_interaction: {e}")
+gateway_lease: GatewayLease | None = None
+metrics.gauge(
+    "speedwagon_gateway_leader",
+    "1 while this instance holds the gateway lease (always 1 without SHARED_STORE).",
+    lambda: 1 if gateway_lease is None or gateway_lease.is_leader else 0,
+)
 
-    handled = False
 
-    if interaction.type == discord.InteractionType.application_command:
-        command_name = interaction.data.get('name') if interaction.data else None
+async def take_over_gateway() -> None:
+    """Catch up on what the previous leader wrote before answering interactions."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, storage.refresh)
+    await account_queue.refresh()
+    rotation_counters.reload()
+
+
+async def run_gateway(token: str) -> None:
+    """SHARED_STORE mode: stand by until this instance holds the gateway lease, then connect."""
+    lease = gateway_lease
+    # Standbys have no gateway events, so keep the liveness heartbeat going from here
+    loop_lag_monitor.start()
+    await lease.acquire()
+    log.info(f"👑 Acquired the gateway lease as {lease.holder}")
+    await take_over_gateway()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # Close cleanly so the lease is released and a standby takes over immediately
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signum, lambda: asyncio.ensure_future(bot.close()))
 
-        if command_name:
-            # Check if it's a custom command stored in our JSON config.
-            custom_commands = load_custom_commands()
-            if command_name in custom_commands:
-                response = custom_commands[command_name]
-                await interaction.response.send_message(response)
-                handled = True
-
-    if not handled:
-        # Let other interactions pass through to the default handler that discord.py
-        # normally provides. ``CommandTree._call`` mirrors the library's built-in
-        # processing (``process_application_commands`` existed only in forks such as
-        # py-cord), so using it keeps behaviour identical across library versions.
+    def on_lease_lost(task: asyncio.Task) -> None:
+        if not task.cancelled():
+            asyncio.ensure_future(bot.close())
+
+    renewal = asyncio.create_task(lease.hold())
+    renewal.add_done_callback(on_lease_lost)
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        renewal.remove_done_callback(on_lease_lost)
+        renewal.cancel()
+        lost = not lease.is_leader
+        await lease.release()
+    if lost:
+        # Exit so the platform restarts this instance as a standby
+        raise SystemExit(1)
+
+
+def apply_runtime_settings() -> None:
+    """Re-read the env-tunable limits now that .env has been loaded."""
+    global welcome_batcher
+    welcome_batcher = WelcomeBatcher.from_env()
+    command_executor.load_env()
+
+
+def elect_gateway_leader() -> None:
+    global gateway_lease
+    if shared_store_enabled():
+        holder = os.getenv('INSTANCE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        gateway_lease = GatewayLease(DATABASE_FILE, holder, ttl=_resolve_int_env("LEADER_LEASE_SECONDS", 10))
+
+
+def attach_command_sync() -> None:
+    global command_sync
+    # Every built-in slash command is registered by now; keep custom names from shadowing them
+    custom_command_table.set_builtin_names({command.name for command in bot.tree.get_commands()})
+    # Custom commands become real slash commands, kept in step with the dispatch table
+    command_sync = CommandSyncManager(bot.tree, storage, _resolve_guild_id())
+    command_sync.attach(custom_command_table)
+
+
+class StartupTimer:
+    """Wall-clock cost of each bootstrap step, for the cold-start report."""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.steps: list[tuple[str, float]] = []
+        self.total = 0.0
+
+    def run(self, name: str, func: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
         try:
-            await bot.tree._call(interaction)
-        except AttributeError:
-            print("⚠️ CommandTree._call is unavailable; interaction was not handled.")
+            return func()
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def run_concurrently(self, steps: dict[str, Callable[[], Any]]) -> None:
+        """Run independent steps on their own threads and record them as one stage."""
+        started = time.perf_counter()
+        durations: dict[str, float] = {}
+
+        def timed(name: str, func: Callable[[], Any]) -> Any:
+            step_started = time.perf_counter()
+            try:
+                return func()
+            finally:
+                durations[name] = time.perf_counter() - step_started
+
+        with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="bootstrap") as pool:
+            futures = [pool.submit(timed, name, func) for name, func in steps.items()]
+        inner = " | ".join(f"{name} {durations[name] * 1000:.1f}" for name in steps)
+        self.steps.append((f"{{{inner}}}", time.perf_counter() - started))
+        for future in futures:
+            future.result()
+
+    def finish(self) -> str:
+        self.total = time.perf_counter() - self._started
+        stages = " · ".join(f"{name} {elapsed * 1000:.1f}" for name, elapsed in self.steps)
+        imports = (_IMPORT_FINISHED - _IMPORT_STARTED) * 1000
+        return f"⏱️ Cold start {self.total * 1000:.1f} ms (module import {imports:.1f} ms): {stages}"
+
+
+_startup: StartupTimer | None = None
+
+
+def bootstrap(start_health: bool = True) -> StartupTimer:
+    """Bring the process up; importing the module performs no I/O and starts no threads.
+
+    Steps run once, in dependency order: .env, logging, the data directory,
+    then the health server, the JSON documents and the SQLite account queue
+    concurrently (none needs another), then the tables derived from the loaded
+    documents and, with SHARED_STORE, the gateway lease. Per-step timings (ms)
+    are logged as the cold-start report.
+    """
+    global _startup, log_listener
+    if _startup is not None:
+        return _startup
+    timer = StartupTimer()
+    timer.run("dotenv", load_dotenv)
+    log_listener = timer.run("logging", configure_logging)
+    timer.run("settings", apply_runtime_settings)
+    timer.run("data_dir", prepare_data_dir)
+    concurrent_steps: dict[str, Callable[[], Any]] = {"documents": open_documents, "account_queue": open_account_queue}
+    if start_health:
+        concurrent_steps["health_server"] = start_health_server
+    timer.run_concurrently(concurrent_steps)
+    timer.run("rotation", load_rotation_counters)
+    timer.run("document_views", build_document_views)
+    timer.run("command_sync", attach_command_sync)
+    timer.run("gateway_lease", elect_gateway_leader)
+    _startup = timer
+    log.info(timer.finish(), extra={"latency_ms": round(timer.total * 1000, 1)})
+    return timer
 
 # Error handling
 @bot.event
@@ -1447,7 +4044,12 @@ async def on_command_error(ctx, error):
     elif isinstance(error, commands.CommandNotFound):
         pass  # Ignore command not found errors
     else:
-        print(f"Error: {error}")
+        log.warning(f"Error: {error}")
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command: app_commands.Command | app_commands.ContextMenu):
+    command_metrics.finish(interaction, "ok")
+
 
 # App command (slash command) error handler
 @bot.tree.error
@@ -1455,46 +4057,47 @@ async def on_app_command_error(interaction: discord.Interaction, error):
     # LAYER 3 DEFENSE: Silently ignore ALL errors from barred users
     try:
         if interaction.user and is_user_barred(interaction.user.id):
-            print(f"🚫 [Layer 3] Silently ignoring error from barred user {interaction.user.id}: {type(error).__name__}")
+            log.info(f"🚫 [Layer 3] Silently ignoring error from barred user {interaction.user.id}: {type(error).__name__}")
             return  # Don't send any response or acknowledge the error
     except Exception as e:
-        print(f"⚠️ Error checking barred status in error handler: {e}")
+        log.warning(f"⚠️ Error checking barred status in error handler: {e}")
     
+    command_metrics.finish(interaction, "denied" if isinstance(error, app_commands.CheckFailure) else "error")
+
+    if isinstance(error, MissingProviderRole):
+        if not interaction.response.is_done():
+            await interaction.response.send_message(str(error), ephemeral=True)
+        return
+
     # For non-barred users, handle CheckFailure silently (could be other checks)
     if isinstance(error, app_commands.CheckFailure):
-        print(f"⚠️ Command check failed for user {interaction.user.id if interaction.user else 'unknown'}: {error}")
+        log.warning(f"⚠️ Command check failed for user {interaction.user.id if interaction.user else 'unknown'}: {error}")
         return
 
+_IMPORT_FINISHED = time.perf_counter()
+
 # Run the bot
 if __name__ == "__main__":
-    print("Starting Speedwagon Discord bot...")
+    bootstrap()
+    log.info("Starting Speedwagon Discord bot...")
     
     # Check if DISCORD_TOKEN exists
     token = os.getenv('DISCORD_TOKEN')
     if not token:
-        print("❌ ERROR: DISCORD_TOKEN environment variable not found!")
-        print("Please set DISCORD_TOKEN in Railway variables")
+        log.error("❌ ERROR: DISCORD_TOKEN environment variable not found!")
+        log.error("Please set DISCORD_TOKEN in Railway variables")
         exit(1)
     
-    print(f"✅ Discord token found (length: {len(token)})")
-    
-    # Start health check server FIRST before anything else
-    print("Starting health check server...")
-    health_ready = start_health_server()
-    
-    if health_ready:
-        print("✅ Health check server is ready")
-        # Give health server a moment to fully bind and start accepting connections
-        time.sleep(1)
-    else:
-        print("⚠️ Health check server failed, but continuing...")
-        # Still sleep briefly to allow any partial startup
-        time.sleep(0.5)
+    log.info(f"✅ Discord token found (length: {len(token)})")
     
     # Start the bot
-    print("Connecting to Discord...")
+    log.info("Connecting to Discord...")
     try:
-        bot.run(token)
+        if gateway_lease is not None:
+            asyncio.run(run_gateway(token))
+        else:
+            # discord.py's own loggers propagate to the queued root handler
+            bot.run(token, log_handler=None)
     except Exception as e:
-        print(f"❌ Failed to start bot: {e}")
+        log.error(f"❌ Failed to start bot: {e}")
         exit(1)
@@ -0,0 +1,130 @@
+"""Concurrency benchmark for /getaccount's lease-based pulls.
+
+Fills a fresh queue, fires many concurrent reserve -> confirm pulls across a
+few categories (some deliveries fail and are released, some are abandoned
+and left to the reaper) and checks that no account is handed out twice and
+that delivered + still queued accounts add up to what was loaded. For
+comparison it also times the old /getaccount path, which read, popped and
+rewrote accounts.json synchronously on the event loop for every pull.
+
+    python scripts/account_lease_bench.py [pulls]
+"""
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+CATEGORIES = ("netflix", "hulu", "spotify", "disney")
+PER_CATEGORY = 2500
+FAIL_RATE = 0.10
+ABANDON_RATE = 0.05
+NAIVE_PULLS = 500
+
+
+def accounts(category: str) -> list[str]:
+    return [f"{category}{index}@example.com:pw" for index in range(PER_CATEGORY)]
+
+
+async def naive(pulls: int) -> tuple[int, int, int, float]:
+    """The pre-SQLite /getaccount: load accounts.json, pop(0), save it back, with no await in between.
+
+    Nothing yields between load and save, so pulls never interleave; the cost
+    is the whole file read and rewritten on the event loop for every pull.
+    """
+    path = os.path.join(main.DATA_DIR, "naive_accounts.json")
+    with open(path, "w") as f:
+        json.dump({category: accounts(category) for category in CATEGORIES}, f, indent=2)
+    handed: list[str] = []
+
+    async def pull(category: str) -> None:
+        with open(path) as f:
+            store = json.load(f)
+        queued = store.get(category, [])
+        if queued:
+            handed.append(queued.pop(0))
+            if not queued:
+                store.pop(category, None)
+            with open(path, "w") as f:
+                json.dump(store, f, indent=2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pull(random.choice(CATEGORIES)) for _ in range(pulls)))
+    elapsed = time.perf_counter() - started
+    with open(path) as f:
+        remaining = sum(len(value) for value in json.load(f).values())
+    return len(handed), len(set(handed)), remaining, elapsed
+
+async def leased(pulls: int) -> bool:
+    queue = main.AccountQueueStore(os.path.join(main.DATA_DIR, "lease_bench.db"), lease_seconds=0.2)
+    queue.open()
+    for category in CATEGORIES:
+        await queue.push(category, accounts(category))
+
+    delivered: list[str] = []
+    outcomes: collections.Counter = collections.Counter()
+
+    async def pull(holder: int) -> None:
+        lease = await queue.reserve(random.choice(CATEGORIES), holder)
+        if lease is None:
+            outcomes["empty"] += 1
+            return
+        roll = random.random()
+        await asyncio.sleep(random.random() * 0.002)
+        if roll < FAIL_RATE:
+            await queue.release(lease)
+            outcomes["released"] += 1
+        elif roll < FAIL_RATE + ABANDON_RATE:
+            outcomes["abandoned"] += 1
+        else:
+            delivered.append(lease.line)
+            outcomes["confirmed" if await queue.confirm(lease) else "late"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pull(holder) for holder in range(pulls)))
+    elapsed = time.perf_counter() - started
+    # Let every abandoned lease expire, then reap it back into the queues
+    await asyncio.sleep(0.25)
+    reaped = await queue.reap_expired()
+
+    remaining = sum(queue.counts().values())
+    duplicates = len(delivered) - len(set(delivered))
+    conserved = len(delivered) + remaining == PER_CATEGORY * len(CATEGORIES)
+    print(f"leased: {pulls} concurrent pulls in {elapsed:.2f}s ({pulls / elapsed:.0f}/s) {dict(outcomes)}")
+    print(
+        f"  delivered {len(delivered)}, duplicates {duplicates}, remaining {remaining}, "
+        f"reaped {reaped}, outstanding {queue.leased()}, conserved={conserved}"
+    )
+    return duplicates == 0 and conserved and queue.leased() == 0
+
+
+async def run(pulls: int) -> bool:
+    # The old pattern rewrites the whole file per pull, so time a slice of the run
+    naive_pulls = min(pulls, NAIVE_PULLS)
+    handed, distinct, remaining, elapsed = await naive(naive_pulls)
+    print(
+        f"load/pop/save: {naive_pulls} pulls in {elapsed:.2f}s ({naive_pulls / elapsed:.0f}/s), "
+        f"{handed} handed out, {distinct} distinct, {remaining} still queued"
+    )
+    return await leased(pulls)
+
+
+def main_() -> int:
+    pulls = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    main.bootstrap(start_health=False)
+    ok = asyncio.run(run(pulls))
+    main.storage.flush()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,48 @@
+"""Time is_user_barred() against the file-backed check it replaced.
+
+The old check read and parsed barred_users.json on every call; the current
+one is a set lookup on the in-memory registry.
+
+    python scripts/barred_check_bench.py [calls]
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+# A single slash command used to hit the check up to this many times
+CHECKS_PER_INTERACTION = 4
+
+
+def file_backed_is_user_barred(user_id: int) -> bool:
+    """The pre-registry check: existence probe, open and parse per call."""
+    if not os.path.exists(main.BARRED_USERS_FILE):
+        with open(main.BARRED_USERS_FILE, 'w') as f:
+            json.dump({"barred_users": []}, f, indent=2)
+    with open(main.BARRED_USERS_FILE, 'r') as f:
+        data = json.load(f)
+        return str(user_id) in set(data.get("barred_users", []))
+
+
+def main_() -> int:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    main.bootstrap(start_health=False)
+    for user_id in range(1000, 1020):
+        main.add_barred_user(user_id)
+    main.storage.flush()
+    for label, check in (("before", file_backed_is_user_barred), ("after", main.is_user_barred)):
+        assert check(1005) and not check(7)
+        per_call = min(timeit.repeat(lambda: check(7), number=calls, repeat=3)) / calls * 1e6
+        print(f"{label:6}: {per_call:7.2f} us/call (~{per_call * CHECKS_PER_INTERACTION:.1f} us per interaction)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
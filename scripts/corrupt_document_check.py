@@ -0,0 +1,39 @@
+"""Check that a damaged JSON document survives a boot.
+
+Writes a truncated barred_users.json into a fresh data directory, runs
+bootstrap() (which seeds the default barred IDs, i.e. writes the document)
+and checks that the original bytes were moved aside rather than overwritten.
+
+    python scripts/corrupt_document_check.py
+"""
+import glob
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+DAMAGED = b'{\n  "barred_users": [\n    "111",\n    "222",\n    "33'
+
+
+def main_() -> int:
+    path = os.path.join(os.environ["DATA_DIR"], "barred_users.json")
+    with open(path, "wb") as f:
+        f.write(DAMAGED)
+    main.bootstrap(start_health=False)
+    main.storage.flush()
+    kept = glob.glob(path + ".corrupt-*")
+    ok = len(kept) == 1
+    if ok:
+        with open(kept[0], "rb") as f:
+            ok = f.read() == DAMAGED
+    print(f"damaged copy kept: {kept} intact={ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
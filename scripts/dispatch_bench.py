@@ -0,0 +1,102 @@
+"""Time custom-command dispatch against the per-interaction file reads it replaced.
+
+With 50 custom commands defined, the old ``on_interaction`` listener read and
+parsed barred_users.json and custom_commands.json for every interaction
+before probing the name; today both are in-memory lookups. For scale it also
+times a whole dispatch through the command tree (barred check, built-in
+lookup, custom-table fallback) with ``send_message`` stubbed out.
+
+    python scripts/dispatch_bench.py [calls]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+CUSTOM_COMMANDS = 50
+
+
+def file_backed_lookup(user_id: int, name: str) -> str | None:
+    """The pre-table prelude: barred check and custom-command probe, both read from disk."""
+    with open(main.BARRED_USERS_FILE, 'r') as f:
+        if str(user_id) in set(json.load(f).get("barred_users", [])):
+            return None
+    try:
+        with open(main.COMMANDS_FILE, 'r') as f:
+            commands = json.load(f)
+    except FileNotFoundError:
+        commands = {}
+    return commands.get(name)
+
+
+def payload(name: str) -> dict:
+    return {
+        "id": "1000", "application_id": "1", "type": 2, "token": "t", "version": 1,
+        "channel_id": "5", "data": {"id": "9", "name": name, "type": 1},
+        "user": {"id": "7", "username": "u", "discriminator": "0", "avatar": None},
+    }
+
+
+async def tree_dispatch(name: str, calls: int) -> float:
+    state = main.bot._connection
+    data = payload(name)
+    started = time.perf_counter()
+    for _ in range(calls):
+        await main.bot.tree._call(discord.Interaction(data=data, state=state))
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def in_memory_lookup(user_id: int, name: str) -> str | None:
+    """The same prelude today: registry check and dispatch-table probe."""
+    if main.is_user_barred(user_id):
+        return None
+    return main.custom_command_table.lookup(name)
+
+
+async def run(calls: int) -> None:
+    main.bot.loop = main.bot._connection.loop = asyncio.get_running_loop()
+    for label, lookup in (("before", file_backed_lookup), ("after", in_memory_lookup)):
+        assert lookup(7, "cmd25") == "Response 25"
+        started = time.perf_counter()
+        for _ in range(calls):
+            lookup(7, "cmd25")
+        print(f"{label:6}: barred check + custom lookup    {(time.perf_counter() - started) / calls * 1e6:6.2f} us")
+    # For scale: the whole tree dispatch around that lookup
+    print(f"full tree dispatch, custom command   {await tree_dispatch('cmd25', calls):6.2f} us")
+    print(f"full tree dispatch, built-in command {await tree_dispatch('ping', calls):6.2f} us")
+
+
+def main_() -> int:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    main.bootstrap(start_health=False)
+    for index in range(CUSTOM_COMMANDS):
+        main.storage.apply("custom_commands", {"op": "set", "key": f"cmd{index}", "value": f"Response {index}"})
+    main.storage.flush()
+
+    async def send_message(self, content=None, **kwargs):
+        self._response_type = discord.InteractionResponseType.channel_message
+
+    discord.InteractionResponse.send_message = send_message
+
+    @main.bot.tree.command(name="ping", description="Benchmark command")
+    async def ping(interaction: discord.Interaction):
+        await interaction.response.send_message("pong")
+
+    main.custom_command_table.set_builtin_names({"ping"})
+    asyncio.run(run(calls))
+    main.storage.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
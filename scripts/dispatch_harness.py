@@ -0,0 +1,108 @@
+"""Count handler invocations per interaction on discord.py's real dispatch path.
+
+Feeds raw INTERACTION_CREATE payloads through
+``ConnectionState.parse_interaction_create`` (no gateway connection) and
+checks that each interaction runs the barred-user check once, does at most
+one custom-command lookup, runs at most one callback and is acknowledged at
+most once.
+
+    python scripts/dispatch_harness.py
+"""
+import asyncio
+import collections
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+COUNTERS = ("barred_check", "custom_lookup", "builtin_callback", "send", "double_ack_error")
+BARRED_USER_ID = 424242
+
+# label, command name, user id, expected counts
+CASES = (
+    ("builtin /ping", "ping", 7, {"barred_check": 1, "custom_lookup": 0, "builtin_callback": 1, "send": 1}),
+    ("custom /menu", "menu", 7, {"barred_check": 1, "custom_lookup": 1, "builtin_callback": 0, "send": 1}),
+    ("barred /ping", "ping", BARRED_USER_ID, {"barred_check": 1, "custom_lookup": 0, "builtin_callback": 0, "send": 0}),
+)
+
+counts: collections.Counter = collections.Counter()
+
+
+def instrument() -> None:
+    is_user_barred = main.is_user_barred
+    lookup = main.custom_command_table.lookup
+
+    def counted_barred(user_id):
+        counts["barred_check"] += 1
+        return is_user_barred(user_id)
+
+    def counted_lookup(name):
+        counts["custom_lookup"] += 1
+        return lookup(name)
+
+    async def send_message(self, content=None, **kwargs):
+        if self._response_type:
+            counts["double_ack_error"] += 1
+            raise discord.InteractionResponded(self._parent)
+        counts["send"] += 1
+        self._response_type = discord.InteractionResponseType.channel_message
+
+    main.is_user_barred = counted_barred
+    main.custom_command_table.lookup = counted_lookup
+    discord.InteractionResponse.send_message = send_message
+
+    @main.bot.tree.command(name="ping", description="Harness command")
+    async def ping(interaction: discord.Interaction):
+        counts["builtin_callback"] += 1
+        await interaction.response.send_message("pong")
+
+    async def ignore_error(interaction, error):
+        pass
+
+    main.bot.tree.on_error = ignore_error
+
+
+def payload(interaction_id: int, name: str, user_id: int) -> dict:
+    return {
+        "id": str(interaction_id), "application_id": "1", "type": 2, "token": "t", "version": 1,
+        "channel_id": "5", "data": {"id": "9", "name": name, "type": 1},
+        "user": {"id": str(user_id), "username": "u", "discriminator": "0", "avatar": None},
+    }
+
+
+async def run() -> bool:
+    state = main.bot._connection
+    main.bot.loop = state.loop = asyncio.get_running_loop()
+    ok = True
+    for interaction_id, (label, name, user_id, expected) in enumerate(CASES, start=1000):
+        counts.clear()
+        state.parse_interaction_create(payload(interaction_id, name, user_id))
+        # Let the dispatched tasks run to completion
+        for _ in range(20):
+            await asyncio.sleep(0)
+        expected = {"double_ack_error": 0, **expected}
+        failed = [key for key in COUNTERS if counts[key] != expected[key]]
+        ok = ok and not failed
+        print(f"{label:14} " + ", ".join(f"{key}={counts[key]}" for key in COUNTERS) + (f"  FAIL {failed}" if failed else ""))
+    return ok
+
+
+def main_() -> int:
+    main.bootstrap(start_health=False)
+    main.storage.apply("custom_commands", {"op": "set", "key": "menu", "value": "Today's menu"})
+    main.add_barred_user(BARRED_USER_ID)
+    instrument()
+    ok = asyncio.run(run())
+    main.storage.flush()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_())